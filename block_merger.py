@@ -1,6 +1,25 @@
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from notion_client import Client
 from config import Config
+from rate_limiter import RateLimiter, call_with_retry
+
+# Notion 對每個 integration 約有 3 req/s 的限制
+MAX_WORKERS = 5
+REQUESTS_PER_SECOND = 3
+MAX_APPEND_CHILDREN = 100  # 每次 append 請求的子區塊上限
+
+# 程式碼分段標題：同時包含「程式碼」以及「部分」或「第」
+_CHUNK_TITLE_RE = re.compile(r'^(?=.*程式碼)(?=.*(?:部分|第))', re.DOTALL)
+
+
+@lru_cache(maxsize=4096)
+def _is_chunk_title(title):
+    """檢查標題是否為程式碼分段標題"""
+    return _CHUNK_TITLE_RE.match(title) is not None
+
 
 class BlockMerger:
     """Notion 程式碼區塊合併工具（智能分段版本）"""
@@ -8,6 +27,17 @@ class BlockMerger:
     def __init__(self, notion_token):
         self.notion = Client(auth=notion_token)
         self.MAX_CHUNK_SIZE = 1800  # 安全的字元限制（留一些緩衝）
+        self._rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+        self._blocks_cache = {}  # page_id -> 區塊列表（頁面結構變動後失效）
+        self._index_cache = {}  # page_id -> {block_id: 位置}
+    
+    def _call_api(self, method, idempotent=True, **kwargs):
+        """
+        在限速下呼叫 Notion API，遇到 429 等錯誤時重試（見 rate_limiter.call_with_retry）
+        
+        插入區塊不是冪等操作，呼叫時需傳入 idempotent=False
+        """
+        return call_with_retry(self._rate_limiter, method, idempotent=idempotent, **kwargs)
     
     def merge_code_blocks_in_page(self, page_id):
         """
@@ -20,7 +50,8 @@ class BlockMerger:
             bool: 是否成功合併
         """
         try:
-            # 獲取頁面所有區塊
+            # 獲取頁面所有區塊（捨棄先前的快取，確保取得最新內容）
+            self._invalidate_page_cache(page_id)
             blocks = self._get_all_blocks(page_id)
             
             # 找出程式碼區塊群組
@@ -45,64 +76,108 @@ class BlockMerger:
             return False
     
     def _get_all_blocks(self, page_id):
-        """獲取頁面所有區塊"""
-        blocks = []
+        """獲取頁面所有區塊（使用快取）"""
+        cached = self._blocks_cache.get(page_id)
+        if cached is not None:
+            return cached
+        
+        blocks = list(self._iter_all_blocks(page_id))
+        
+        self._blocks_cache[page_id] = blocks
+        self._index_cache[page_id] = {block['id']: i for i, block in enumerate(blocks)}
+        return blocks
+    
+    def _iter_all_blocks(self, page_id):
+        """逐頁產生頁面區塊（不保留整份列表）"""
         has_more = True
         start_cursor = None
         
         while has_more:
-            response = self.notion.blocks.children.list(
+            response = self._call_api(
+                self.notion.blocks.children.list,
                 block_id=page_id,
                 start_cursor=start_cursor,
                 page_size=100
             )
             
-            blocks.extend(response['results'])
+            yield from response['results']
             has_more = response['has_more']
             start_cursor = response.get('next_cursor')
+    
+    def _invalidate_page_cache(self, page_id):
+        """頁面結構變動後清除快取"""
+        self._blocks_cache.pop(page_id, None)
+        self._index_cache.pop(page_id, None)
+    
+    def _project_blocks(self, blocks):
+        """
+        單次走訪區塊，擷取分組所需的欄位（平行陣列）
         
-        return blocks
+        Returns:
+            tuple: (kinds, ids, languages)
+                kinds: 'code' / 'chunk_title'（程式碼分段標題）/ 'other'
+                languages: 程式碼區塊的語言，其他區塊為 None
+        """
+        kinds = []
+        ids = []
+        languages = []
+        
+        for block in blocks:
+            block_type = block['type']
+            language = None
+            
+            if block_type == 'code':
+                kind = 'code'
+                language = block['code'].get('language', 'text')
+            elif (block_type == 'heading_3' and block['heading_3']['rich_text'] and
+                  _is_chunk_title(block['heading_3']['rich_text'][0]['text']['content'])):
+                kind = 'chunk_title'
+            else:
+                kind = 'other'
+            
+            kinds.append(kind)
+            ids.append(block['id'])
+            languages.append(language)
+        
+        return kinds, ids, languages
     
     def _find_code_block_groups(self, blocks):
-        """找出連續的程式碼區塊群組"""
+        """找出連續的程式碼區塊群組（並記錄相關的分段標題）"""
+        # 少於兩個程式碼區塊時不可能合併，直接略過
+        code_count = sum(1 for block in blocks if block['type'] == 'code')
+        if code_count < 2:
+            return []
+        
+        kinds, ids, languages = self._project_blocks(blocks)
         groups = []
         current_group = None
         
-        for i, block in enumerate(blocks):
-            if block['type'] == 'code':
-                if current_group is None:
-                    # 開始新的群組
-                    current_group = {
-                        'start_index': i,
-                        'blocks': [block],
-                        'language': block['code'].get('language', 'text')
-                    }
-                elif block['code'].get('language') == current_group['language']:
-                    # 延續當前群組（相同語言）
-                    current_group['blocks'].append(block)
-                else:
+        for i, kind in enumerate(kinds):
+            if kind == 'code':
+                if current_group is None or languages[i] != current_group['language']:
                     # 語言不同，結束當前群組，開始新群組
-                    if len(current_group['blocks']) > 1:
+                    if current_group and len(current_group['blocks']) > 1:
                         groups.append(current_group)
                     
                     current_group = {
                         'start_index': i,
-                        'blocks': [block],
-                        'language': block['code'].get('language', 'text')
+                        'blocks': [],
+                        'language': languages[i],
+                        'associated_title_ids': set()
                     }
-            elif block['type'] == 'heading_3' and block['heading_3']['rich_text']:
-                # 檢查是否是程式碼分段標題
-                title = block['heading_3']['rich_text'][0]['text']['content']
-                if '程式碼' in title and ('部分' in title or '第' in title):
-                    # 這是程式碼分段標題，跳過（稍後會被刪除）
-                    continue
-                else:
-                    # 其他標題，中斷程式碼群組
-                    if current_group and len(current_group['blocks']) > 1:
-                        groups.append(current_group)
-                    current_group = None
+                
+                # 延續當前群組（相同語言）
+                current_group['blocks'].append(blocks[i])
+                
+                # 區塊前兩格內的分段標題屬於這個群組
+                for j in (i - 2, i - 1):
+                    if j >= 0 and kinds[j] == 'chunk_title':
+                        current_group['associated_title_ids'].add(ids[j])
+            elif kind == 'chunk_title':
+                # 這是程式碼分段標題，跳過（稍後會被刪除）
+                continue
             else:
-                # 非程式碼區塊，結束當前群組
+                # 非程式碼區塊或其他標題，結束當前群組
                 if current_group and len(current_group['blocks']) > 1:
                     groups.append(current_group)
                 current_group = None
@@ -118,7 +193,7 @@ class BlockMerger:
         try:
             # 收集所有程式碼內容
             all_content = []
-            blocks_to_delete = []
+            blocks_to_delete = set()
             
             for block in group['blocks']:
                 # 提取程式碼內容
@@ -126,13 +201,19 @@ class BlockMerger:
                     content = block['code']['rich_text'][0]['text']['content']
                     all_content.append(content)
                 
-                blocks_to_delete.append(block['id'])
+                blocks_to_delete.add(block['id'])
+            
+            # 分組時已記錄相關的分段標題，不需重新掃描頁面
+            blocks_to_delete.update(group['associated_title_ids'])
             
             # 合併內容
             merged_content = '\n'.join(all_content)
             
             print(f"🔄 智能合併 {len(group['blocks'])} 個程式碼區塊 ({len(merged_content)} 字元)")
             
+            # 只獲取一次頁面區塊，後續的插入與刪除皆使用快取
+            self._get_all_blocks(page_id)
+            
             # 如果內容小於限制，直接合併
             if len(merged_content) <= self.MAX_CHUNK_SIZE:
                 return self._create_single_block(page_id, group, merged_content, blocks_to_delete)
@@ -143,6 +224,9 @@ class BlockMerger:
         except Exception as e:
             print(f"❌ 智能合併群組失敗: {str(e)}")
             return False
+        finally:
+            # 頁面結構已變動，快取失效
+            self._invalidate_page_cache(page_id)
     
     def _create_single_block(self, page_id, group, content, blocks_to_delete):
         """創建單個程式碼區塊"""
@@ -166,20 +250,10 @@ class BlockMerger:
             previous_block_id = self._get_previous_block_id(page_id, first_block['id'])
             
             # 插入新區塊
-            if previous_block_id:
-                self.notion.blocks.children.append(
-                    block_id=page_id,
-                    children=[new_block],
-                    after=previous_block_id
-                )
-            else:
-                self.notion.blocks.children.append(
-                    block_id=page_id,
-                    children=[new_block]
-                )
+            self._append_blocks(page_id, [new_block], previous_block_id)
             
             # 刪除原始區塊和相關的分段標題
-            self._delete_related_blocks(page_id, group)
+            self._delete_blocks(blocks_to_delete)
             
             print(f"✅ 成功創建單個合併區塊")
             return True
@@ -191,29 +265,7 @@ class BlockMerger:
     def _create_chunked_blocks(self, page_id, group, merged_content, blocks_to_delete):
         """創建分段的程式碼區塊（優化版本）"""
         try:
-            # 將內容按行分割
-            lines = merged_content.split('\n')
-            chunks = []
-            current_chunk = []
-            current_size = 0
-            
-            for line in lines:
-                line_size = len(line) + 1  # +1 for newline
-                
-                # 如果當前區塊加上這行會超過限制
-                if current_size + line_size > self.MAX_CHUNK_SIZE and current_chunk:
-                    # 保存當前區塊
-                    chunks.append('\n'.join(current_chunk))
-                    current_chunk = [line]
-                    current_size = line_size
-                else:
-                    # 添加到當前區塊
-                    current_chunk.append(line)
-                    current_size += line_size
-            
-            # 添加最後一個區塊
-            if current_chunk:
-                chunks.append('\n'.join(current_chunk))
+            chunks = self._split_content(merged_content)
             
             # 如果分段後只有一個區塊，說明單行就超過了限制，需要強制截斷
             if len(chunks) == 1 and len(chunks[0]) > self.MAX_CHUNK_SIZE:
@@ -258,20 +310,10 @@ class BlockMerger:
                 new_blocks.append(code_block)
             
             # 批次插入新區塊
-            if previous_block_id:
-                self.notion.blocks.children.append(
-                    block_id=page_id,
-                    children=new_blocks,
-                    after=previous_block_id
-                )
-            else:
-                self.notion.blocks.children.append(
-                    block_id=page_id,
-                    children=new_blocks
-                )
+            self._append_blocks(page_id, new_blocks, previous_block_id)
             
             # 刪除原始區塊和相關的分段標題
-            self._delete_related_blocks(page_id, group)
+            self._delete_blocks(blocks_to_delete)
             
             print(f"✅ 成功創建 {len(chunks)} 個優化分段區塊")
             return True
@@ -280,73 +322,89 @@ class BlockMerger:
             print(f"❌ 創建分段區塊失敗: {str(e)}")
             return False
     
+    def _append_blocks(self, page_id, new_blocks, after=None):
+        """
+        批次插入區塊（100 個以內只發一次請求）
+        
+        超過上限時分批送出，並以上一批最後一個區塊作為下一批的插入位置
+        """
+        for i in range(0, len(new_blocks), MAX_APPEND_CHILDREN):
+            batch = new_blocks[i:i + MAX_APPEND_CHILDREN]
+            
+            if after:
+                response = self._call_api(
+                    self.notion.blocks.children.append,
+                    idempotent=False,
+                    block_id=page_id,
+                    children=batch,
+                    after=after
+                )
+                after = response['results'][-1]['id']
+            else:
+                self._call_api(
+                    self.notion.blocks.children.append,
+                    idempotent=False,
+                    block_id=page_id,
+                    children=batch
+                )
+    
+    def _split_content(self, merged_content):
+        """將內容按行（只認 '\\n'）切分為不超過 MAX_CHUNK_SIZE 的區塊，'\\n'.join(chunks) 可還原原內容"""
+        chunks = []
+        pos = 0
+        length = len(merged_content)
+        
+        # 以 rfind 找分段處的換行，直接以位移切出原始字串
+        # （不用 splitlines：它也會在 \x0c、\u2028 等字元處斷行，分段時會弄丟這些字元）
+        while True:
+            if length - pos < self.MAX_CHUNK_SIZE:
+                chunks.append(merged_content[pos:])
+                return chunks
+            
+            split = merged_content.rfind('\n', pos, pos + self.MAX_CHUNK_SIZE)
+            if split < 0:
+                # 單行超過限制：整行自成一個區塊
+                split = merged_content.find('\n', pos)
+                if split < 0:
+                    chunks.append(merged_content[pos:])
+                    return chunks
+            
+            # 保存當前區塊（去掉分段處的換行）
+            chunks.append(merged_content[pos:split])
+            pos = split + 1
+    
     def _get_previous_block_id(self, page_id, target_block_id):
         """獲取目標區塊的前一個區塊ID"""
         blocks = self._get_all_blocks(page_id)
+        i = self._index_cache[page_id].get(target_block_id)
         
-        for i, block in enumerate(blocks):
-            if block['id'] == target_block_id:
-                if i > 0:
-                    return blocks[i-1]['id']
-                else:
-                    return None  # 第一個區塊
-        return None
+        if i:
+            return blocks[i-1]['id']
+        return None  # 第一個區塊或找不到
     
-    def _delete_related_blocks(self, page_id, group):
-        """刪除相關的區塊（程式碼區塊和分段標題）"""
-        all_blocks = self._get_all_blocks(page_id)
-        blocks_to_delete = []
-        
-        # 添加程式碼區塊
-        for block in group['blocks']:
-            blocks_to_delete.append(block['id'])
-        
-        # 查找並添加相關的分段標題
-        for i, block in enumerate(all_blocks):
-            if (block['type'] == 'heading_3' and 
-                block['heading_3']['rich_text'] and
-                block['id'] not in blocks_to_delete):
-                
-                title = block['heading_3']['rich_text'][0]['text']['content']
-                if '程式碼' in title and ('部分' in title or '第' in title):
-                    # 檢查這個標題是否在我們要刪除的程式碼區塊附近
-                    if self._is_title_related_to_group(all_blocks, i, group):
-                        blocks_to_delete.append(block['id'])
-        
-        # 刪除所有相關區塊
-        for block_id in blocks_to_delete:
-            try:
-                self.notion.blocks.delete(block_id=block_id)
-            except:
-                pass  # 忽略刪除失敗的區塊
+    def _delete_blocks(self, blocks_to_delete):
+        """刪除區塊（程式碼區塊和分段標題）"""
+        # 並行刪除所有相關區塊
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            list(executor.map(self._safe_delete, blocks_to_delete))
     
-    def _is_title_related_to_group(self, all_blocks, title_index, group):
-        """檢查標題是否與程式碼群組相關"""
-        group_block_ids = {block['id'] for block in group['blocks']}
-        
-        # 檢查標題後面幾個區塊是否屬於這個群組
-        for i in range(title_index + 1, min(title_index + 3, len(all_blocks))):
-            if all_blocks[i]['id'] in group_block_ids:
-                return True
-        
-        return False
+    def _safe_delete(self, block_id):
+        """刪除單一區塊（受限速控制並重試，最終仍失敗則忽略）"""
+        try:
+            self._call_api(self.notion.blocks.delete, block_id=block_id)
+        except:
+            pass  # 忽略刪除失敗的區塊
     
     def merge_all_pages_under_parent(self, parent_page_id):
         """合併父頁面下所有子頁面的程式碼區塊"""
         try:
-            # 獲取父頁面下的所有子頁面
-            children = self.notion.blocks.children.list(block_id=parent_page_id)
-            
-            merged_pages = 0
-            for child in children['results']:
-                if child['type'] == 'child_page':
-                    page_id = child['id']
-                    page_title = child['child_page']['title']
-                    
-                    print(f"🔍 處理頁面: {page_title}")
-                    
-                    if self.merge_code_blocks_in_page(page_id):
-                        merged_pages += 1
+            # 逐頁獲取父頁面下的所有子頁面
+            child_pages = (child for child in self._iter_all_blocks(parent_page_id)
+                           if child['type'] == 'child_page')
+            
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                results = executor.map(self._merge_child_page, child_pages)
+                merged_pages = sum(1 for merged in results if merged)
             
             print(f"\n✨ 完成！成功處理 {merged_pages} 個頁面")
             return merged_pages > 0
@@ -354,6 +412,11 @@ class BlockMerger:
         except Exception as e:
             print(f"❌ 批次合併失敗: {str(e)}")
             return False
+    
+    def _merge_child_page(self, child):
+        """合併單一子頁面的程式碼區塊"""
+        print(f"🔍 處理頁面: {child['child_page']['title']}")
+        return self.merge_code_blocks_in_page(child['id'])
 
 # 使用範例
 if __name__ == "__main__":
@@ -2,10 +2,27 @@
 # -*- coding: utf-8 -*-
 
 import json
+import re
 import argparse
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from notion_client import Client
 from config import Config
+from rate_limiter import RateLimiter, call_with_retry
+
+# Concurrent Notion requests; all of them share one limiter (Notion allows roughly 3 requests/s)
+MAX_WORKERS = 5
+REQUESTS_PER_SECOND = 3
+# Blocks requested first when looking for the path paragraph
+PATH_SCAN_PAGE_SIZE = 10
+# Scan progress is reported after every block of this many child pages
+SCAN_PROGRESS_INTERVAL = 25
+
+# Path detection patterns, each scanned in a single pass over the text
+_PATH_MARKER_RE = re.compile(r'📁 (?:Path|路徑):')
+_PLAIN_PATH_RE = re.compile(r'C:\\\\|/home/|/Users/')
 
 class NotionCleanupTool:
     """Tool for cleaning up duplicate Notion pages - PATH-AWARE VERSION"""
@@ -14,6 +31,85 @@ class NotionCleanupTool:
         """Initialize cleanup tool"""
         self.notion_token = notion_token or Config.NOTION_TOKEN
         self.notion = Client(auth=self.notion_token)
+        self._path_cache = {}  # page_id -> extracted file path (successful lookups only)
+        self._scan_cache = {}  # parent_page_id -> scanned child pages (only scans without errors)
+        self._rate_limiter = RateLimiter(REQUESTS_PER_SECOND, burst=REQUESTS_PER_SECOND)
+    
+    def _call_api(self, method, **kwargs):
+        """Call a Notion API method under the rate limit, with retries (see rate_limiter.call_with_retry)"""
+        return call_with_retry(self._rate_limiter, method, **kwargs)
+    
+    def _scan_children(self, parent_page_id):
+        """
+        Scan all child pages under a parent once, fetching details in parallel
+        
+        Args:
+            parent_page_id: Parent page ID to search under
+            
+        Returns:
+            list: Child page dicts (id, title, file_path, timestamps, archived, error)
+        """
+        if parent_page_id in self._scan_cache:
+            return self._scan_cache[parent_page_id]
+        
+        # Page through all children; a single list call returns at most 100 of them
+        child_pages = []
+        start_cursor = None
+        while True:
+            response = self._call_api(
+                self.notion.blocks.children.list,
+                block_id=parent_page_id,
+                start_cursor=start_cursor,
+                page_size=100
+            )
+            child_pages.extend(child for child in response['results'] if child['type'] == 'child_page')
+            if not response.get('has_more'):
+                break
+            start_cursor = response.get('next_cursor')
+        
+        pages = []
+        total = len(child_pages)
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+            # map yields each result as soon as it (and those before it) are done, so progress shows during the scan
+            for scanned, page in enumerate(executor.map(self._scan_child_page, child_pages), 1):
+                pages.append(page)
+                if scanned % SCAN_PROGRESS_INTERVAL == 0 or scanned == total:
+                    print(f"   ⏳ Scanned {scanned}/{total} pages")
+        
+        # A page that failed to load would otherwise be missing from every later check
+        if not any(page['error'] for page in pages):
+            self._scan_cache[parent_page_id] = pages
+        return pages
+    
+    def _invalidate_scan(self, parent_page_id=None):
+        """Drop the cached scan of a parent page (all cached scans if the parent is unknown)"""
+        if parent_page_id is None:
+            self._scan_cache.clear()
+        else:
+            self._scan_cache.pop(parent_page_id, None)
+    
+    def _scan_child_page(self, child):
+        """Fetch file path and metadata for a single child page"""
+        page = {
+            'id': child['id'],
+            'title': child['child_page']['title'],
+            'file_path': None,
+            'created_time': '',
+            'last_edited_time': '',
+            'archived': False,
+            'error': None
+        }
+        
+        try:
+            page['file_path'] = self._extract_file_path_from_page(page['id'])
+            page_details = self._call_api(self.notion.pages.retrieve, page_id=page['id'])
+            page['created_time'] = page_details.get('created_time', '')
+            page['last_edited_time'] = page_details.get('last_edited_time', '')
+            page['archived'] = page_details.get('archived', False)
+        except Exception as e:
+            page['error'] = str(e)
+        
+        return page
     
     def find_true_duplicates_with_path_check(self, parent_page_id, project_path=None):
         """
@@ -27,45 +123,33 @@ class NotionCleanupTool:
             list: List of TRUE duplicate page groups (same title AND same path)
         """
         try:
-            children = self.notion.blocks.children.list(block_id=parent_page_id)
-            
             # Group pages by title AND extracted file path
-            page_groups = {}
+            page_groups = defaultdict(list)
             
             print("🔍 Analyzing pages and extracting file paths...")
             
-            for child in children['results']:
-                if child['type'] == 'child_page':
-                    page_title = child['child_page']['title']
-                    page_id = child['id']
+            for page in self._scan_children(parent_page_id):
+                page_title = page['title']
+                file_path = page['file_path']
+                
+                if page['error']:
+                    print(f"   ❌ Error processing page {page_title}: {page['error']}")
+                elif file_path:
+                    # Create unique key: filename + path
+                    unique_key = (page_title, file_path)
                     
-                    # Get page content to extract the actual file path
-                    try:
-                        page_details = self.notion.pages.retrieve(page_id=page_id)
-                        file_path = self._extract_file_path_from_page(page_id)
-                        
-                        if file_path:
-                            # Create unique key: filename + path
-                            unique_key = f"{page_title}::{file_path}"
-                            
-                            if unique_key not in page_groups:
-                                page_groups[unique_key] = []
-                            
-                            page_groups[unique_key].append({
-                                'id': page_id,
-                                'title': page_title,
-                                'file_path': file_path,
-                                'created_time': page_details.get('created_time', ''),
-                                'last_edited_time': page_details.get('last_edited_time', ''),
-                                'archived': page_details.get('archived', False)
-                            })
-                            
-                            print(f"   📄 {page_title} -> {file_path}")
-                        else:
-                            print(f"   ⚠️ Could not extract path from: {page_title}")
-                            
-                    except Exception as e:
-                        print(f"   ❌ Error processing page {page_title}: {str(e)}")
+                    page_groups[unique_key].append({
+                        'id': page['id'],
+                        'title': page_title,
+                        'file_path': file_path,
+                        'created_time': page['created_time'],
+                        'last_edited_time': page['last_edited_time'],
+                        'archived': page['archived']
+                    })
+                    
+                    print(f"   📄 {page_title} -> {file_path}")
+                else:
+                    print(f"   ⚠️ Could not extract path from: {page_title}")
             
             # Find TRUE duplicates (same filename AND same path)
             true_duplicates = []
@@ -78,15 +162,16 @@ class NotionCleanupTool:
                         page_title = active_pages[0]['title']
                         file_path = active_pages[0]['file_path']
                         
-                        print(f"🚨 TRUE DUPLICATE found:")
+                        print("🚨 TRUE DUPLICATE found:")
                         print(f"   File: {page_title}")
                         print(f"   Path: {file_path}")
                         print(f"   Duplicates: {len(active_pages)} copies")
                         
                         # Sort by creation time (keep newest)
-                        active_pages.sort(key=lambda x: x.get('created_time', ''), reverse=True)
+                        active_pages.sort(key=itemgetter('created_time'), reverse=True)
                         
                         true_duplicates.append({
+                            'parent_page_id': parent_page_id,
                             'base_title': page_title,
                             'file_path': file_path,
                             'pages': active_pages,
@@ -110,41 +195,70 @@ class NotionCleanupTool:
             
         Returns:
             str|None: File path or None if not found
+            
+        Raises:
+            Exception: If the page's blocks could not be fetched (not cached, so a later call retries)
         """
-        try:
-            # Get page content blocks
-            blocks = self.notion.blocks.children.list(block_id=page_id)
-            
-            for block in blocks['results']:
-                if block['type'] == 'paragraph':
-                    # Look for the path information in paragraph blocks
-                    paragraph = block['paragraph']
-                    if paragraph.get('rich_text'):
-                        for text_obj in paragraph['rich_text']:
-                            content = text_obj.get('text', {}).get('content', '')
-                            
-                            # Look for path pattern: "📁 Path: C:\\..."
-                            if '📁 Path:' in content or '📁 路徑:' in content:
-                                # Extract path after the colon
-                                path_start = content.find(':') + 1
-                                path_line = content[path_start:].split('\\n')[0].strip()
-                                
-                                if path_line:
-                                    return path_line
-                                    
-                            # Also check for plain path patterns
-                            elif 'C:\\\\' in content or '/home/' in content or '/Users/' in content:
-                                lines = content.split('\\n')
-                                for line in lines:
-                                    line = line.strip()
-                                    if ('C:\\\\' in line or '/home/' in line or '/Users/' in line) and len(line) > 10:
-                                        return line
-            
-            return None
+        if page_id not in self._path_cache:
+            self._path_cache[page_id] = self._fetch_file_path_from_page(page_id)
+        return self._path_cache[page_id]
+    
+    def _fetch_file_path_from_page(self, page_id):
+        """Fetch page blocks and search them for the file path (uncached, API errors propagate)"""
+        # The path paragraph sits near the top, so try a small first page
+        response = self._call_api(self.notion.blocks.children.list, block_id=page_id, page_size=PATH_SCAN_PAGE_SIZE)
+        
+        while True:
+            file_path = self._find_file_path_in_blocks(response['results'])
+            if file_path or not response.get('has_more'):
+                return file_path
+            
+            # Not found near the top, fall back to full pagination
+            response = self._call_api(
+                self.notion.blocks.children.list,
+                block_id=page_id,
+                start_cursor=response.get('next_cursor'),
+                page_size=100
+            )
+    
+    def _find_file_path_in_blocks(self, blocks):
+        """
+        Search paragraph blocks for the file path, stopping at the first match
+        
+        Args:
+            blocks: List of Notion block objects
             
-        except Exception as e:
-            print(f"❌ Error extracting path from page {page_id}: {str(e)}")
-            return None
+        Returns:
+            str|None: File path or None if not found
+        """
+        for block in blocks:
+            if block['type'] == 'paragraph':
+                # Look for the path information in paragraph blocks
+                paragraph = block['paragraph']
+                if paragraph.get('rich_text'):
+                    for text_obj in paragraph['rich_text']:
+                        content = text_obj.get('text', {}).get('content', '')
+                        
+                        # Look for path pattern: "📁 Path: C:\\..."
+                        marker = _PATH_MARKER_RE.search(content)
+                        if marker:
+                            # Extract path after the marker, up to the end of the line
+                            line_end = content.find('\n', marker.end())
+                            path_line = content[marker.end():line_end if line_end != -1 else None].strip()
+                            
+                            if path_line:
+                                return path_line
+                            continue
+                        
+                        # Also check for plain path patterns
+                        for match in _PLAIN_PATH_RE.finditer(content):
+                            line_start = content.rfind('\n', 0, match.start()) + 1
+                            line_end = content.find('\n', match.end())
+                            line = content[line_start:line_end if line_end != -1 else None].strip()
+                            if len(line) > 10:
+                                return line
+        
+        return None
     
     def find_same_name_different_path_files(self, parent_page_id):
         """
@@ -154,21 +268,14 @@ class NotionCleanupTool:
             dict: Dictionary of filename -> list of different paths
         """
         try:
-            children = self.notion.blocks.children.list(block_id=parent_page_id)
-            
-            filename_to_paths = {}
+            filename_to_paths = defaultdict(set)
             
-            for child in children['results']:
-                if child['type'] == 'child_page':
-                    page_title = child['child_page']['title']
-                    page_id = child['id']
-                    
-                    file_path = self._extract_file_path_from_page(page_id)
-                    
-                    if file_path:
-                        if page_title not in filename_to_paths:
-                            filename_to_paths[page_title] = set()
-                        filename_to_paths[page_title].add(file_path)
+            for page in self._scan_children(parent_page_id):
+                page_title = page['title']
+                file_path = page['file_path']
+                
+                if file_path:
+                    filename_to_paths[page_title].add(file_path)
             
             # Filter to only show files with same name but different paths
             different_path_files = {}
@@ -208,37 +315,45 @@ class NotionCleanupTool:
             file_path = group['file_path']
             pages = group['pages']
             
-            print(f"\\n📄 File: {filename}")
-            print(f"📂 Path: {file_path}")
-            print(f"🔢 Copies: {len(pages)} identical versions")
+            # Collect this group's report and print it once
+            report = [
+                f"\n📄 File: {filename}",
+                f"📂 Path: {file_path}",
+                f"🔢 Copies: {len(pages)} identical versions"
+            ]
             
             # Show all versions with timestamps
             for i, page in enumerate(pages):
                 status = "📌 KEEP (newest)" if i == 0 else f"🗑️ REMOVE (#{i+1})"
                 created = page.get('created_time', 'Unknown')[:19]  # Truncate timestamp
                 edited = page.get('last_edited_time', 'Unknown')[:19]
-                print(f"     {status}")
-                print(f"        ID: {page['id']}")
-                print(f"        Created: {created}")
-                print(f"        Edited: {edited}")
+                report.append(f"     {status}")
+                report.append(f"        ID: {page['id']}")
+                report.append(f"        Created: {created}")
+                report.append(f"        Edited: {edited}")
             
             # Remove duplicates (keep the first one - newest)
             pages_to_remove = pages[1:]
             
             for i, page in enumerate(pages_to_remove, 2):
                 if dry_run:
-                    print(f"   🔍 [DRY RUN] Would archive copy #{i}: {page['title']}")
+                    report.append(f"   🔍 [DRY RUN] Would archive copy #{i}: {page['title']}")
                     cleaned_count += 1
                 else:
                     try:
-                        result = self.notion.pages.update(
+                        result = self._call_api(
+                            self.notion.pages.update,
                             page_id=page['id'],
                             archived=True
                         )
-                        print(f"   ✅ Archived copy #{i}: {page['title']}")
+                        report.append(f"   ✅ Archived copy #{i}: {page['title']}")
                         cleaned_count += 1
+                        # The cached scan still lists the archived page; rescan next time
+                        self._invalidate_scan(group.get('parent_page_id'))
                     except Exception as e:
-                        print(f"   ❌ Failed to archive copy #{i}: {str(e)}")
+                        report.append(f"   ❌ Failed to archive copy #{i}: {str(e)}")
+            
+            print('\n'.join(report))
         
         return cleaned_count
     
@@ -264,7 +379,7 @@ class NotionCleanupTool:
             
             print(f"🔍 PATH-AWARE scanning for project: {project_path}")
             print(f"📂 Parent page ID: {parent_page_id}")
-            print("\\n🎯 Step 1: Finding same-name but different-path files (these will be PRESERVED)...")
+            print("\n🎯 Step 1: Finding same-name but different-path files (these will be PRESERVED)...")
             
             # First, show files with same name but different paths
             different_path_files = self.find_same_name_different_path_files(parent_page_id)
@@ -279,7 +394,7 @@ class NotionCleanupTool:
             else:
                 print("   ✅ No same-name different-path files found")
             
-            print("\\n🎯 Step 2: Finding TRUE duplicates (same name AND same path)...")
+            print("\n🎯 Step 2: Finding TRUE duplicates (same name AND same path)...")
             
             # Find TRUE duplicates (same name AND same path)
             true_duplicates = self.find_true_duplicates_with_path_check(parent_page_id, project_path)
@@ -366,9 +481,9 @@ IMPORTANT NOTES:
             print("🔍 PATH-AWARE SCAN MODE - Finding TRUE duplicates only...")
             cleaned_count = cleanup_tool.cleanup_project_duplicates(str(project_path), dry_run=True)
             if cleaned_count > 0:
-                print(f"\\n💡 Run 'python cleanup_tool.py clean {args.path}' to actually clean {cleaned_count} TRUE duplicate pages")
+                print(f"\n💡 Run 'python cleanup_tool.py clean {args.path}' to actually clean {cleaned_count} TRUE duplicate pages")
             else:
-                print("\\n✅ No TRUE duplicates found")
+                print("\n✅ No TRUE duplicates found")
             
         elif args.command == 'clean':
             dry_run = getattr(args, 'dry_run', False)
@@ -381,18 +496,18 @@ IMPORTANT NOTES:
             
             if dry_run:
                 if cleaned_count > 0:
-                    print(f"\\n💡 Run without --dry-run to actually clean {cleaned_count} TRUE duplicate pages")
+                    print(f"\n💡 Run without --dry-run to actually clean {cleaned_count} TRUE duplicate pages")
                 else:
-                    print("\\n✅ No TRUE duplicates found")
+                    print("\n✅ No TRUE duplicates found")
             else:
                 if cleaned_count > 0:
-                    print(f"\\n✨ PATH-AWARE cleanup completed: {cleaned_count} TRUE duplicate pages archived")
+                    print(f"\n✨ PATH-AWARE cleanup completed: {cleaned_count} TRUE duplicate pages archived")
                     print("🎯 Files with same name but different paths were PRESERVED")
                 else:
-                    print("\\n✅ No TRUE duplicates found to clean")
+                    print("\n✅ No TRUE duplicates found to clean")
         
     except KeyboardInterrupt:
-        print("\\n⚠️ Operation cancelled by user")
+        print("\n⚠️ Operation cancelled by user")
     except Exception as e:
         print(f"❌ Cleanup operation failed: {str(e)}")
         import traceback
@@ -1,20 +1,31 @@
 import os
-from dotenv import load_dotenv
-from pathlib import Path
+import fnmatch
+from dotenv import dotenv_values
+from pathlib import Path, PurePath
 import re
+from functools import lru_cache
+from types import MappingProxyType
+
+_UUID_RE = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+_HEX32_RE = re.compile(r'[0-9a-fA-F]{32}')
 
 class Config:
     """Configuration management class with dynamic .env loading"""
     
-    # Default values
-    _notion_token = None
-    _parent_page_id = None
-    _project_root = None
-    _max_content_length = 100000
-    _cache_file = '.notion_sync_cache.json'
+    # Current settings (plain class attributes, updated by load_env_from_path)
+    NOTION_TOKEN = None
+    PARENT_PAGE_ID = None
+    PROJECT_ROOT = None
+    MAX_CONTENT_LENGTH = 100000
+    CACHE_FILE = '.notion_sync_cache.json'
+    
+    # Settings already loaded per .env file (each file is parsed only once)
+    _loaded_env_files = {}
+    # Raw PARENT_PAGE_ID -> normalized ID, for IDs that already passed validation
+    _validated_page_ids = {}
     
-    # Supported programming languages and their extensions
-    SUPPORTED_LANGUAGES = {
+    # Supported programming languages and their extensions (read-only)
+    SUPPORTED_LANGUAGES = MappingProxyType({
         '.py': 'python',
         '.cs': 'c#',
         '.js': 'javascript',
@@ -52,10 +63,11 @@ class Config:
         '.vue': 'vue',
         '.jsx': 'javascript',
         '.tsx': 'typescript',
-    }
+    })
+    _SUPPORTED_EXT_TUPLE = tuple(SUPPORTED_LANGUAGES)
     
-    # File and directory patterns to ignore
-    IGNORE_PATTERNS = [
+    # File and directory patterns to ignore (immutable, precompiled by _compile_ignore)
+    IGNORE_PATTERNS = (
         # Version control
         '.git', '.svn', '.hg',
         # Dependencies
@@ -70,7 +82,12 @@ class Config:
         '.DS_Store', 'Thumbs.db',
         # Package files
         '*.min.js', '*.min.css',
-    ]
+    )
+    
+    # Precompiled form of IGNORE_PATTERNS (built lazily by _compile_ignore)
+    _ignore_literals = None
+    _ignore_suffixes = None
+    _ignore_wildcard_re = None
     
     @classmethod
     def load_env_from_path(cls, path):
@@ -83,60 +100,63 @@ class Config:
         while current_path != current_path.parent:  # Stop at root
             env_file = current_path / '.env'
             if env_file.exists():
-                print(f"Loading .env from: {env_file}")
-                load_dotenv(env_file)
-                
-                # Update class variables with loaded values
-                cls._notion_token = os.getenv('NOTION_TOKEN')
-                cls._parent_page_id = os.getenv('PARENT_PAGE_ID')
-                cls._project_root = os.getenv('PROJECT_ROOT', str(current_path))
-                cls._max_content_length = int(os.getenv('MAX_CONTENT_LENGTH', '100000'))
-                cls._cache_file = os.getenv('CACHE_FILE', str(current_path / '.notion_sync_cache.json'))
-                
+                cls._load_env_file(
+                    env_file,
+                    f"Loading .env from: {env_file}",
+                    default_project_root=str(current_path),
+                    default_cache_file=str(current_path / '.notion_sync_cache.json')
+                )
                 return True
             current_path = current_path.parent
         
         # Fallback to main directory .env
         main_env = Path.cwd() / '.env'
         if main_env.exists():
-            print(f"Loading .env from main directory: {main_env}")
-            load_dotenv(main_env)
-            
-            cls._notion_token = os.getenv('NOTION_TOKEN')
-            cls._parent_page_id = os.getenv('PARENT_PAGE_ID')
-            cls._project_root = os.getenv('PROJECT_ROOT', '.')
-            cls._max_content_length = int(os.getenv('MAX_CONTENT_LENGTH', '100000'))
-            cls._cache_file = os.getenv('CACHE_FILE', '.notion_sync_cache.json')
-            
+            cls._load_env_file(
+                main_env,
+                f"Loading .env from main directory: {main_env}",
+                default_project_root='.',
+                default_cache_file='.notion_sync_cache.json'
+            )
             return True
         
         print("Warning: No .env file found in path hierarchy")
         return False
     
     @classmethod
-    @property
-    def NOTION_TOKEN(cls):
-        return cls._notion_token
-    
-    @classmethod  
-    @property
-    def PARENT_PAGE_ID(cls):
-        return cls._parent_page_id
-    
-    @classmethod
-    @property
-    def PROJECT_ROOT(cls):
-        return cls._project_root
-    
-    @classmethod
-    @property
-    def MAX_CONTENT_LENGTH(cls):
-        return cls._max_content_length
-    
-    @classmethod
-    @property
-    def CACHE_FILE(cls):
-        return cls._cache_file
+    def _load_env_file(cls, env_file, message, default_project_root, default_cache_file):
+        """Load a .env file at most once per process and apply its settings"""
+        settings = cls._loaded_env_files.get(env_file)
+        
+        if settings is None:
+            print(message)
+            
+            # Parse once; existing environment variables take precedence (same as load_dotenv)
+            env = {
+                key: os.environ.get(key, value)
+                for key, value in dotenv_values(env_file).items()
+                if value is not None
+            }
+            os.environ.update(env)
+            
+            def get(key, default=None):
+                return env[key] if key in env else os.environ.get(key, default)
+            
+            settings = {
+                'notion_token': get('NOTION_TOKEN'),
+                'parent_page_id': get('PARENT_PAGE_ID'),
+                'project_root': get('PROJECT_ROOT', default_project_root),
+                'max_content_length': int(get('MAX_CONTENT_LENGTH', '100000')),
+                'cache_file': get('CACHE_FILE', default_cache_file),
+            }
+            cls._loaded_env_files[env_file] = settings
+        
+        # Update class variables with loaded values
+        cls.NOTION_TOKEN = settings['notion_token']
+        cls.PARENT_PAGE_ID = settings['parent_page_id']
+        cls.PROJECT_ROOT = settings['project_root']
+        cls.MAX_CONTENT_LENGTH = settings['max_content_length']
+        cls.CACHE_FILE = settings['cache_file']
     
     @classmethod
     def validate(cls, project_path=None):
@@ -145,27 +165,35 @@ class Config:
             cls.load_env_from_path(project_path)
         else:
             # Load from current directory if not already loaded
-            if not cls._notion_token:
+            if not cls.NOTION_TOKEN:
                 cls.load_env_from_path(Path.cwd())
         
-        if not cls._notion_token:
+        if not cls.NOTION_TOKEN:
             print("❌ NOTION_TOKEN not found in environment variables")
             print("Please set NOTION_TOKEN in .env file")
             return False
         
-        if not cls._parent_page_id:
+        if not cls.PARENT_PAGE_ID:
             print("❌ PARENT_PAGE_ID not found in environment variables")
             print("Please set PARENT_PAGE_ID in .env file")
             return False
         
-        # Normalize page ID format
-        cls._parent_page_id = cls.normalize_page_id(cls._parent_page_id)
+        # Normalize page ID format (skipped for IDs already normalized and validated)
+        normalized_id = cls._validated_page_ids.get(cls.PARENT_PAGE_ID)
+        if normalized_id is None:
+            normalized_id = cls.normalize_page_id(cls.PARENT_PAGE_ID)
+            
+            if not cls._is_valid_page_id(normalized_id):
+                cls.PARENT_PAGE_ID = normalized_id
+                print("❌ PARENT_PAGE_ID format is invalid")
+                print("Expected format: xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx (UUID format)")
+                print(f"❌ Invalid: {cls.PARENT_PAGE_ID}")
+                return False
+            
+            cls._validated_page_ids[cls.PARENT_PAGE_ID] = normalized_id
+            cls._validated_page_ids[normalized_id] = normalized_id
         
-        if not cls._is_valid_page_id(cls._parent_page_id):
-            print("❌ PARENT_PAGE_ID format is invalid")
-            print("Expected format: xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx (UUID format)")
-            print(f"❌ Invalid: {cls._parent_page_id}")
-            return False
+        cls.PARENT_PAGE_ID = normalized_id
         
         print("✅ Configuration validation successful")
         return True
@@ -186,8 +214,8 @@ class Config:
         # Remove all hyphens first
         clean_id = page_id.replace('-', '')
         
-        # Check if it's 32 hex characters
-        if len(clean_id) == 32 and all(c in '0123456789abcdefABCDEF' for c in clean_id):
+        # Check if it's 32 hex characters (case is preserved)
+        if _HEX32_RE.fullmatch(clean_id):
             # Insert hyphens in UUID format: 8-4-4-4-12
             return f"{clean_id[:8]}-{clean_id[8:12]}-{clean_id[12:16]}-{clean_id[16:20]}-{clean_id[20:]}"
         
@@ -196,41 +224,76 @@ class Config:
     @classmethod
     def _is_valid_page_id(cls, page_id):
         """Check if page ID is valid UUID format"""
-        uuid_pattern = r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$'
-        return bool(re.match(uuid_pattern, page_id))
+        return _UUID_RE.fullmatch(page_id) is not None
     
     @classmethod
     def get_supported_extensions(cls):
-        """Get list of all supported file extensions"""
-        return list(cls.SUPPORTED_LANGUAGES.keys())
+        """Get tuple of all supported file extensions"""
+        return cls._SUPPORTED_EXT_TUPLE
     
     @classmethod
+    @lru_cache(maxsize=128)
     def get_language_for_extension(cls, extension):
         """Get programming language for file extension"""
         return cls.SUPPORTED_LANGUAGES.get(extension.lower(), 'text')
     
+    @classmethod
+    def _compile_ignore(cls):
+        """Partition IGNORE_PATTERNS once into literal names, suffixes and other globs"""
+        literals = []
+        suffixes = []
+        wildcards = []
+        
+        for pattern in cls.IGNORE_PATTERNS:
+            if not any(c in pattern for c in '*?['):
+                literals.append(pattern)
+            elif pattern.startswith('*') and not any(c in pattern[1:] for c in '*?['):
+                # '*suffix' pattern: plain file suffix match
+                suffixes.append(pattern[1:])
+            else:
+                wildcards.append(pattern)
+        
+        cls._ignore_literals = frozenset(literals)
+        cls._ignore_suffixes = tuple(suffixes)
+        cls._ignore_wildcard_re = (
+            re.compile('|'.join(fnmatch.translate(p) for p in wildcards)) if wildcards else None
+        )
+        cls._is_ignored_segment.cache_clear()
+    
+    @classmethod
+    @lru_cache(maxsize=8192)
+    def _is_ignored_segment(cls, part):
+        """Check a single path segment against the precompiled ignore patterns (memoized)"""
+        if part in cls._ignore_literals or part.endswith(cls._ignore_suffixes):
+            return True
+        return bool(cls._ignore_wildcard_re and cls._ignore_wildcard_re.match(part))
+    
     @classmethod
     def should_ignore_path(cls, path):
         """Check if path should be ignored based on ignore patterns"""
-        path_obj = Path(path)
-        
-        # Check each part of the path against patterns (exact segment match)
-        for part in path_obj.parts:
-            for pattern in cls.IGNORE_PATTERNS:
-                if pattern.startswith('*'):
-                    # Wildcard pattern: match file suffix
-                    if part.endswith(pattern[1:]):
-                        return True
-                else:
-                    # Exact segment match only
-                    if part == pattern:
-                        return True
+        if cls._ignore_literals is None:
+            cls._compile_ignore()
         
-        return False
+        # Use existing Path parts as-is; split plain strings directly instead of building a Path
+        if isinstance(path, PurePath):
+            parts = path.parts
+        else:
+            parts = os.fspath(path).replace('\\', '/').split('/')
+        
+        # Check each part of the path against patterns (exact, case-sensitive segment match).
+        # Directory segments repeat across a scan, so per-segment results are cached.
+        return any(map(cls._is_ignored_segment, parts))
+    
+    @classmethod
+    def should_ignore_dirname(cls, name):
+        """Check a single directory or file name, so walkers can prune ignored subtrees before descending"""
+        if cls._ignore_literals is None:
+            cls._compile_ignore()
+        return cls._is_ignored_segment(name)
     
     @classmethod
     def get_cache_path(cls, project_path=None):
         """Get cache file path for specific project"""
         if project_path:
             return Path(project_path) / '.notion_sync_cache.json'
-        return Path(cls._cache_file or '.notion_sync_cache.json')
\ No newline at end of file
+        return Path(cls.CACHE_FILE or '.notion_sync_cache.json')
\ No newline at end of file
@@ -3,26 +3,26 @@
 
 import argparse
 import sys
+from functools import lru_cache
 from pathlib import Path
 from config import Config
 from notion_sync import NotionSync
 
-def print_banner():
-    """Print application banner"""
-    banner = """
+_BANNER = """
 ╔══════════════════════════════════════════════════════════════╗
 ║           Notion Code File Sync Tool v2.0 (Improved)       ║
 ║                                                              ║
 ║     Sync code project files to Notion with smart updates    ║
 ╚══════════════════════════════════════════════════════════════╝
     """
-    print(banner)
 
-def main():
-    """Main entry point"""
-    print_banner()
-    
-    # Setup command line argument parser
+def print_banner():
+    """Print application banner"""
+    print(_BANNER)
+
+@lru_cache(maxsize=1)
+def _build_parser():
+    """Build the command line argument parser (constructed once and reused)"""
     parser = argparse.ArgumentParser(
         description='Sync code project files to Notion pages with improved duplicate handling',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -81,7 +81,14 @@ Notes:
     clean_parser = subparsers.add_parser('clean', help='Clean deleted files from cache')
     clean_parser.add_argument('path', help='Project directory path')
     
+    return parser
+
+def main():
+    """Main entry point"""
+    print_banner()
+    
     # Parse arguments
+    parser = _build_parser()
     args = parser.parse_args()
     
     if not args.command:
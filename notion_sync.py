@@ -1,10 +1,81 @@
 import os
+import codecs
 import hashlib
 import json
+import mmap
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from notion_client import Client
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
 from config import Config
+from rate_limiter import RateLimiter, call_with_retry
+
+# Files are synced concurrently; Notion allows roughly 3 requests/s per integration
+MAX_WORKERS = 5
+REQUESTS_PER_SECOND = 3
+MAX_APPEND_CHILDREN = 100  # Notion API limit on children per append request
+# Cache is checkpointed to disk after this many processed files
+CACHE_SAVE_INTERVAL = 50
+# Files at least this large are hashed through mmap instead of read() (setup cost dominates below)
+MMAP_HASH_THRESHOLD = 64 * 1024
+# Read size when a file has to be hashed by streaming (stays resident in L2 cache)
+HASH_BUFFER_SIZE = 128 * 1024
+
+# Recorded with each cache entry; entries without it predate BLAKE2b and hold MD5 hashes
+HASH_ALGO = 'blake2b'
+
+# Page heading icon per language (read-only)
+_FILE_ICONS = MappingProxyType({
+    'c#': '🔷',
+    'python': '🐍',
+    'javascript': '📜',
+    'typescript': '📘',
+    'java': '☕',
+    'c++': '⚡',
+    'c': '🔧',
+    'go': '🔷',
+    'rust': '🦀',
+    'php': '🐘',
+    'ruby': '💎',
+    'swift': '🕊️',
+    'kotlin': '🎯'
+})
+
+
+def _new_file_hasher(data=b''):
+    """Create the content fingerprint hasher (16-byte BLAKE2b, same hex length as MD5)"""
+    return hashlib.blake2b(data, digest_size=16)
+
+
+def _decode_source(raw):
+    """
+    Decode source file bytes: a UTF-32/UTF-16 BOM picks the codec directly (these files
+    can never decode as utf-8), otherwise try utf-8 and then gbk. Returns None if all fail.
+    """
+    if raw.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        encodings = ('utf-32',)
+    elif raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        encodings = ('utf-16',)
+    else:
+        encodings = ('utf-8', 'gbk')
+    
+    for encoding in encodings:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _as_absolute(path):
+    """Return path as an absolute Path, calling resolve() (several stat calls) only for relative input"""
+    path = Path(path)
+    return path if path.is_absolute() else path.resolve()
+
 
 class NotionSync:
     """Notion file sync core class with pull functionality"""
@@ -20,7 +91,18 @@ class NotionSync:
         self.notion_token = notion_token or Config.NOTION_TOKEN
         self.parent_page_id = parent_page_id or Config.PARENT_PAGE_ID
         self.notion = Client(auth=self.notion_token)
+        self._client_token = self.notion_token
         self.sync_cache = {}
+        self._cache_lock = threading.Lock()  # sync_cache is updated from worker threads
+        # All API calls share one limiter: up to 3 requests at once, then 3 per second
+        self._rate_limiter = RateLimiter(REQUESTS_PER_SECOND, burst=REQUESTS_PER_SECOND)
+        
+    def _refresh_client(self):
+        """Rebuild the Notion client only when the token changed, keeping pooled HTTP connections otherwise"""
+        if self.notion_token != self._client_token:
+            self.notion.close()
+            self.notion = Client(auth=self.notion_token)
+            self._client_token = self.notion_token
         
     def load_cache_for_project(self, project_path):
         """Load sync cache for specific project"""
@@ -39,7 +121,18 @@ class NotionSync:
         Returns:
             list: List of code file paths
         """
-        source_files = []
+        return [file_path for file_path, _ in self._scan_source_entries(root_path, extensions)]
+    
+    def _scan_source_entries(self, root_path, extensions=None):
+        """
+        Scan like scan_source_files, but keep each file's os.DirEntry alongside its path.
+        DirEntry.stat() caches its result (and is free on Windows, where the directory
+        listing already carries it), so the sync can reuse it instead of stat-ing again.
+        
+        Returns:
+            list: Sorted list of (Path, os.DirEntry) tuples
+        """
+        source_entries = []
         root = Path(root_path).resolve()  # Resolve to absolute path
         
         if not root.exists():
@@ -52,47 +145,84 @@ class NotionSync:
         print(f"Starting directory scan: {root}")
         print(f"Supported file types: {', '.join(extensions)}")
         
-        for ext in extensions:
-            pattern = f"*{ext}"
-            for file_path in root.rglob(pattern):
-                # Check if in ignore list
-                if Config.should_ignore_path(str(file_path)):
-                    continue
-                    
-                source_files.append(file_path)
+        # Single directory walk matching all extensions at once (instead of one rglob per extension).
+        # Ignored names below the root are filtered during the walk, so only the root itself is checked here.
+        if not Config.should_ignore_path(root):
+            source_entries.extend(
+                (Path(entry.path), entry) for entry in self._walk_source_files(str(root), tuple(extensions))
+            )
         
         # Sort by file path for consistent processing order
-        source_files.sort()
+        source_entries.sort(key=itemgetter(0))
         
-        print(f"Scan complete, found {len(source_files)} code files")
-        return source_files
+        print(f"Scan complete, found {len(source_entries)} code files")
+        return source_entries
+    
+    def _walk_source_files(self, directory, extensions):
+        """
+        Recursively yield files under directory whose names end with one of extensions.
+        Ignored directories are pruned without descending into them, and ignored file names are skipped.
+        
+        Args:
+            directory: Directory path string
+            extensions: Tuple of file extensions
+            
+        Yields:
+            os.DirEntry: Matching file entry
+        """
+        try:
+            with os.scandir(directory) as entries:
+                subdirs = []
+                for entry in entries:
+                    if Config.should_ignore_dirname(entry.name):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(extensions) and entry.is_file():
+                        yield entry
+        except PermissionError:
+            return  # Unreadable directories are skipped, like rglob does
+        
+        for subdir in subdirs:
+            yield from self._walk_source_files(subdir, extensions)
     
     def get_file_hash(self, file_path):
         """
-        Calculate MD5 hash of file
+        Calculate BLAKE2b content fingerprint of file, without loading large files into memory.
+        The sync path hashes the bytes it has already read instead; this is the standalone helper.
         
         Args:
             file_path: File path
             
         Returns:
-            str: MD5 hash string
+            str: Hex digest (32 characters for the 16-byte BLAKE2b, same length as MD5)
         """
         try:
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-                return hashlib.md5(file_content).hexdigest()
+            # Unbuffered: every path below reads in its own block sizes
+            with open(file_path, 'rb', buffering=0) as f:
+                if os.fstat(f.fileno()).st_size < MMAP_HASH_THRESHOLD:
+                    return _new_file_hasher(f.read()).hexdigest()
+                
+                try:
+                    # Hash the mapped pages directly, without copying the file into a bytes object
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        return _new_file_hasher(mm).hexdigest()
+                except (OSError, ValueError):
+                    pass  # File cannot be mapped; stream it instead
+                
+                # file_digest runs the read/hash loop in C (Python 3.11+)
+                if hasattr(hashlib, 'file_digest'):
+                    return hashlib.file_digest(f, _new_file_hasher).hexdigest()
+                hasher = _new_file_hasher()
+                for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b''):
+                    hasher.update(chunk)
+                return hasher.hexdigest()
         except Exception as e:
             print(f"Cannot calculate file hash {file_path}: {str(e)}")
             return None
     
-    def get_file_size(self, file_path):
-        """Get file size"""
-        try:
-            return os.path.getsize(file_path)
-        except:
-            return 0
-    
-    def create_or_update_subpage(self, file_path, project_root, force_update=False, use_plain_text=False, update_mode='recreate'):
+    def create_or_update_subpage(self, file_path, project_root, force_update=False, use_plain_text=False, update_mode='recreate', language=None,
+                                 file_stat=None, progress=""):
         """
         Create or update subpage for file
         
@@ -102,65 +232,95 @@ class NotionSync:
             force_update: Whether to force update
             update_mode: 'recreate' = delete old page and create new;
                          'clear' = keep old page, clear content and rewrite
+            language: Programming language, if already known (derived from the extension otherwise)
+            file_stat: os.stat_result from the scan, if available (the file is stat-ed otherwise)
+            progress: Progress prefix (e.g. "[3/10] "); when given, a "Syncing ..." line is printed first
             
         Returns:
             str|None: Page ID or None (if failed)
         """
-        file_hash = self.get_file_hash(file_path)
-        if not file_hash:
-            return None
-            
         # Fix relative path calculation issue
         try:
-            project_root_path = Path(project_root).resolve()
-            file_absolute_path = Path(file_path).resolve()
-            relative_path = str(file_absolute_path.relative_to(project_root_path))
+            relative_path = str(_as_absolute(file_path).relative_to(_as_absolute(project_root)))
             #relative_path = relative_path.replace('\\', '/')  
         except ValueError as e:
             print(f"Warning: Cannot calculate relative path {file_path}, using absolute path: {e}")
             relative_path = str(Path(file_path).resolve())
             relative_path = relative_path.replace('\\', '/')  
         
-        file_size = self.get_file_size(file_path)
+        if progress:
+            print(f"{progress}Syncing {relative_path}...")
         
-        # Check if update needed
-        if not force_update and relative_path in self.sync_cache:
-            cached_data = self.sync_cache[relative_path]
-            if cached_data.get('hash') == file_hash:
-                print(f"⏭️  Skipping {relative_path} (no changes)")
-                return cached_data.get('page_id')
-        
-        # Read file content
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except UnicodeDecodeError:
-            # Try other encodings
+        # One stat result serves both the unchanged-file short-circuit and the cached file size
+        if file_stat is None:
             try:
-                with open(file_path, 'r', encoding='gbk') as f:
-                    content = f.read()
-            except:
-                print(f"❌ Cannot read file {file_path}: encoding issue")
+                file_stat = os.stat(file_path)
+            except OSError as e:
+                print(f"Cannot stat file {file_path}: {str(e)}")
                 return None
+            
+        file_size = file_stat.st_size
+        cached_data = self.sync_cache.get(relative_path) if not force_update else None
+        
+        # Same size and mtime as the last sync: skip without reading the file
+        if (cached_data
+                and cached_data.get('file_size') == file_size
+                and cached_data.get('st_mtime_ns') == file_stat.st_mtime_ns):
+            print(f"⏭️  Skipping {relative_path} (no changes)")
+            return cached_data.get('page_id')
+        
+        # Stat changed: read the file once; the same bytes are hashed and, if changed, decoded
+        try:
+            with open(file_path, 'rb') as f:
+                raw = f.read()
         except Exception as e:
             print(f"❌ Cannot read file {file_path}: {str(e)}")
             return None
         
+        file_hash = _new_file_hasher(raw).hexdigest()
+        hash_matches = bool(cached_data) and cached_data.get('hash') == file_hash
+        if cached_data and not hash_matches and 'hash_algo' not in cached_data:
+            # A pre-BLAKE2b entry is matched against its MD5 once, so upgrading does not re-upload every file
+            hash_matches = cached_data.get('hash') == hashlib.md5(raw).hexdigest()
+        
+        if hash_matches:
+            with self._cache_lock:
+                cached_data['hash'] = file_hash
+                cached_data['hash_algo'] = HASH_ALGO
+                cached_data['file_size'] = file_size
+                cached_data['st_mtime_ns'] = file_stat.st_mtime_ns
+            print(f"⏭️  Skipping {relative_path} (no changes)")
+            return cached_data.get('page_id')
+        
+        content = _decode_source(raw)
+        if content is None:
+            print(f"❌ Cannot read file {file_path}: encoding issue")
+            return None
+        
+        # Same newline translation as reading in text mode
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        
         # Content will be split into multiple code block parts
         # each up to MAX_CONTENT_LENGTH characters (no truncation)
         
         # Prepare page title and language
         page_title = f"{file_path.name}"
-        language = Config.get_language_for_extension(file_path.suffix)
+        if language is None:
+            language = Config.get_language_for_extension(file_path.suffix)
         
         try:
-            old_page_id = self.sync_cache.get(relative_path, {}).get('page_id')
+            old_entry = self.sync_cache.get(relative_path, {})
+            old_page_id = old_entry.get('page_id')
             
             if old_page_id and update_mode == 'clear':
                 # Clear mode: keep old page, clear content and rewrite
                 try:
                     page_id = old_page_id
-                    self._update_subpage_content(page_id, content, file_path, language, use_plain_text)
+                    block_ids = self._update_subpage_content(
+                        page_id, content, file_path, language, use_plain_text,
+                        block_ids=old_entry.get('block_ids')
+                    )
                     print(f"🔄 Cleared and updated {relative_path}")
                 except Exception as e:
                     print(f"⚠️ Clear mode failed, falling back to recreate: {str(e)}")
@@ -171,7 +331,8 @@ class NotionSync:
                 # Recreate mode: delete old page and create new
                 if old_page_id:
                     try:
-                        self.notion.pages.update(
+                        self._call_api(
+                            self.notion.pages.update,
                             page_id=old_page_id,
                             archived=True
                         )
@@ -179,7 +340,9 @@ class NotionSync:
                     except Exception as e:
                         print(f"⚠️ Could not delete old page: {str(e)}")
                 
-                new_page = self.notion.pages.create(
+                new_page = self._call_api(
+                    self.notion.pages.create,
+                    idempotent=False,
                     parent={
                         "type": "page_id",
                         "page_id": self.parent_page_id
@@ -194,17 +357,22 @@ class NotionSync:
                 )
                 
                 page_id = new_page["id"]
-                self._update_subpage_content(page_id, content, file_path, language, use_plain_text)
+                # Freshly created page has no children, so skip the list/delete pass
+                block_ids = self._update_subpage_content(page_id, content, file_path, language, use_plain_text,
+                                                         clear_existing=False)
             print(f"✅ Created {relative_path}")
             
             # Update cache
-            self.sync_cache[relative_path] = {
-                'page_id': page_id,
-                'hash': file_hash,
-                'last_sync': datetime.now().isoformat(),
-                'file_size': file_size,
-                'language': language
-            }
+            with self._cache_lock:
+                self.sync_cache[relative_path] = {
+                    'page_id': page_id,
+                    'hash': file_hash,
+                    'hash_algo': HASH_ALGO,
+                    'file_size': file_size,
+                    'language': language,
+                    'st_mtime_ns': file_stat.st_mtime_ns,
+                    'block_ids': block_ids
+                }
             
             return page_id
             
@@ -212,7 +380,8 @@ class NotionSync:
             print(f"❌ Sync failed {relative_path}: {str(e)}")
             return None
     
-    def _update_subpage_content(self, page_id, content, file_path, language, use_plain_text=False):
+    def _update_subpage_content(self, page_id, content, file_path, language, use_plain_text=False, block_ids=None,
+                                clear_existing=True):
         """
         Update subpage content
 
@@ -221,34 +390,16 @@ class NotionSync:
             content: File content
             file_path: File path
             language: Programming language
+            block_ids: IDs of the page's content blocks from the last sync; when the new
+                       content has the same number of blocks they are updated in place
+            clear_existing: Whether existing children must be deleted first (False for new, empty pages)
+
+        Returns:
+            list|None: IDs of the page's content blocks, or None if the update failed
         """
         try:
-            # Clear existing content
-            children = self.notion.blocks.children.list(block_id=page_id)
-            for block in children["results"]:
-                try:
-                    self.notion.blocks.delete(block_id=block["id"])
-                except:
-                    pass  # Some blocks may not be deletable, ignore errors
-            
             # Choose appropriate icon based on file type
-            file_icons = {
-                'c#': '🔷',
-                'python': '🐍',
-                'javascript': '📜',
-                'typescript': '📘',
-                'java': '☕',
-                'c++': '⚡',
-                'c': '🔧',
-                'go': '🔷',
-                'rust': '🦀',
-                'php': '🐘',
-                'ruby': '💎',
-                'swift': '🕊️',
-                'kotlin': '🎯'
-            }
-            
-            icon = file_icons.get(language, '📄')
+            icon = _FILE_ICONS.get(language, '📄')
             
             # Base content blocks
             blocks = [
@@ -282,100 +433,140 @@ class NotionSync:
             # Split content into code block parts, each up to MAX_CONTENT_LENGTH
             if len(content) > 0:
                 max_block_size = Config.MAX_CONTENT_LENGTH
+                chunks = self._split_content(content, max_block_size)
+                last_number = len(chunks)
                 
-                # Split content by lines into parts of max_block_size each
-                content_lines = content.split('\n')
-                current_chunk_lines = []
-                current_chunk_length = 0
-                chunk_number = 1
-                
-                for line in content_lines:
-                    line_length = len(line) + 1  # +1 for newline character
-                    
-                    # Check if adding this line would exceed limit
-                    if current_chunk_length + line_length > max_block_size and current_chunk_lines:
-                        # Create current chunk as a single code block
-                        chunk_content = '\n'.join(current_chunk_lines)
-                        code_block = self._build_single_code_block(chunk_content, language)
-                        
-                        # Add chunk title if multiple parts
-                        if chunk_number > 1 or len(content) > max_block_size:
-                            blocks.append({
-                                "object": "block",
-                                "type": "heading_3",
-                                "heading_3": {
-                                    "rich_text": [{
-                                        "type": "text", 
-                                        "text": {"content": f"📋 Code (Part {chunk_number})"}
-                                    }]
-                                }
-                            })
-                        
-                        blocks.append(code_block)
-                        
-                        # Start new chunk
-                        current_chunk_lines = [line]
-                        current_chunk_length = line_length
-                        chunk_number += 1
+                for chunk_number, chunk_content in enumerate(chunks, 1):
+                    # Add chunk title if multiple parts
+                    if chunk_number < last_number and (chunk_number > 1 or len(content) > max_block_size):
+                        title = f"📋 Code (Part {chunk_number})"
+                    elif chunk_number == last_number and chunk_number > 1:
+                        title = f"📋 Code (Part {chunk_number}, Complete)"
                     else:
-                        current_chunk_lines.append(line)
-                        current_chunk_length += line_length
-                
-                # Add final chunk
-                if current_chunk_lines:
-                    chunk_content = '\n'.join(current_chunk_lines)
-                    code_block = self._build_single_code_block(chunk_content, language)
+                        title = None
                     
-                    if chunk_number > 1:
+                    if title:
                         blocks.append({
                             "object": "block",
                             "type": "heading_3",
                             "heading_3": {
                                 "rich_text": [{
                                     "type": "text", 
-                                    "text": {"content": f"📋 Code (Part {chunk_number}, Complete)"}
+                                    "text": {"content": title}
                                 }]
                             }
                         })
                     
-                    blocks.append(code_block)
+                    blocks.append(self._build_single_code_block(chunk_content, language))
+            
+            # All new blocks are built before touching the page.
+            # List every existing child first (all pagination pages)
+            old_block_ids = [block["id"] for block in self._iter_child_blocks(page_id)] if clear_existing else []
             
-            # Add blocks to page in batches
-            batch_size = 100
+            # Page still holds exactly the blocks of the last sync, in the same layout:
+            # one update per block instead of delete + append. Blocks added or removed
+            # in Notion since then mean the page has to be cleared and rewritten.
+            if block_ids and old_block_ids == block_ids and len(block_ids) == len(blocks):
+                try:
+                    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                        list(executor.map(self._update_block_in_place, block_ids, blocks))
+                    return block_ids
+                except Exception as e:
+                    print(f"⚠️ In-place update failed, rewriting page content: {str(e)}")
+            
+            # Clear existing content: delete all listed children concurrently
+            if clear_existing:
+                with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                    list(executor.map(self._safe_delete_block, old_block_ids))
+            
+            # Add blocks to page (one request covers up to 100 blocks, which fits most files)
+            batch_size = MAX_APPEND_CHILDREN
+            new_block_ids = []
             for i in range(0, len(blocks), batch_size):
                 batch = blocks[i:i+batch_size]
-                self.notion.blocks.children.append(block_id=page_id, children=batch)
+                response = self._call_api(self.notion.blocks.children.append, idempotent=False,
+                                          block_id=page_id, children=batch)
+                new_block_ids.extend(block["id"] for block in response["results"])
+            
+            return new_block_ids
             
         except Exception as e:
             print(f"Failed to update page content: {str(e)}")
+            return None
+
+    def _split_content(self, content, max_size):
+        """
+        Split content at line boundaries into parts of at most max_size characters.
+        The newline at each split point is dropped, so '\n'.join(parts) restores the content.
+        A single line longer than max_size becomes its own part.
+        """
+        chunks = []
+        pos = 0
+        length = len(content)
+        
+        # Slice the original string by offsets instead of splitting and re-joining lines
+        while True:
+            if length - pos < max_size:
+                chunks.append(content[pos:])
+                return chunks
+            
+            split = content.rfind('\n', pos, pos + max_size)
+            if split < 0:
+                # Line longer than the limit: keep it whole
+                split = content.find('\n', pos)
+                if split < 0:
+                    chunks.append(content[pos:])
+                    return chunks
+            
+            chunks.append(content[pos:split])
+            pos = split + 1
+
+    def _iter_child_blocks(self, page_id):
+        """Yield all child blocks of a page, following pagination (100 blocks per request)"""
+        has_more = True
+        start_cursor = None
+        
+        while has_more:
+            response = self._call_api(
+                self.notion.blocks.children.list,
+                block_id=page_id,
+                start_cursor=start_cursor,
+                page_size=100
+            )
+            
+            yield from response["results"]
+            has_more = response.get("has_more", False)
+            start_cursor = response.get("next_cursor")
+
+    def _update_block_in_place(self, block_id, block):
+        """Replace an existing block's content with the same-typed new block"""
+        block_type = block["type"]
+        self._call_api(self.notion.blocks.update, block_id=block_id, **{block_type: block[block_type]})
+
+    def _safe_delete_block(self, block_id):
+        """Delete a single block, ignoring failures"""
+        try:
+            self._call_api(self.notion.blocks.delete, block_id=block_id)
+        except:
+            pass  # Some blocks may not be deletable, ignore errors
 
+    def _call_api(self, method, idempotent=True, **kwargs):
+        """Call a Notion API method under the shared rate limit, with retries (see rate_limiter.call_with_retry)"""
+        return call_with_retry(self._rate_limiter, method, idempotent, **kwargs)
+    
     def _build_single_code_block(self, content, language, chunk_size=1500):
         """
         Split full source into multiple rich_text parts inside a single code block.
         Notion API limit: each rich_text element max 2000 chars; array max ~100 elements.
         """
-        rich_text_parts = []
-        current_chunk_lines = []
-        current_length = 0
-
-        for line in content.split('\n'):
-            line_len = len(line) + 1  # +1 for newline
-            if current_length + line_len > chunk_size and current_chunk_lines:
-                rich_text_parts.append({
-                    "type": "text",
-                    "text": {"content": '\n'.join(current_chunk_lines) + '\n'}
-                })
-                current_chunk_lines = [line]
-                current_length = line_len
-            else:
-                current_chunk_lines.append(line)
-                current_length += line_len
-
-        if current_chunk_lines:
-            rich_text_parts.append({
-                "type": "text",
-                "text": {"content": '\n'.join(current_chunk_lines)}
-            })
+        # Same line-boundary split as the page-level parts; the newline at each split
+        # point goes back onto the end of the part so the parts concatenate to content
+        parts = self._split_content(content, chunk_size)
+        last = len(parts) - 1
+        rich_text_parts = [
+            {"type": "text", "text": {"content": part + '\n' if i < last else part}}
+            for i, part in enumerate(parts)
+        ]
 
         return {
             "object": "block",
@@ -401,7 +592,7 @@ class NotionSync:
             # Update token and parent page ID if they changed
             self.notion_token = Config.NOTION_TOKEN
             self.parent_page_id = Config.PARENT_PAGE_ID
-            self.notion = Client(auth=self.notion_token)
+            self._refresh_client()
             
             # Load cache for this specific project
             cache_file = self.load_cache_for_project(project_path)
@@ -410,7 +601,8 @@ class NotionSync:
             project_root = Path(project_path).resolve()
             
             # If specific extensions specified, only scan those types
-            source_files = self.scan_source_files(project_root, file_extensions)
+            source_entries = self._scan_source_entries(project_root, file_extensions)
+            source_files = [file_path for file_path, _ in source_entries]
             
             if not source_files:
                 print("No matching code files found")
@@ -423,15 +615,38 @@ class NotionSync:
             language_stats = {}
             success_count = 0
             
-            for i, file_path in enumerate(source_files, 1):
-                print(f"[{i}/{len(source_files)}] ", end="")
-                
-                if self.create_or_update_subpage(file_path, project_root, force_update, use_plain_text, update_mode):
-                    success_count += 1
-                    # Statistics for language type
-                    ext = file_path.suffix
-                    language = Config.get_language_for_extension(ext)
-                    language_stats[language] = language_stats.get(language, 0) + 1
+            # Language is looked up once per file and reused for both the page and the statistics
+            languages = [Config.get_language_for_extension(file_path.suffix) for file_path in source_files]
+            
+            total_files = len(source_files)
+            
+            # Each file is dominated by Notion round-trips, so sync several files concurrently
+            def sync_file(numbered_entry, language):
+                i, (file_path, dir_entry) = numbered_entry
+                try:
+                    file_stat = dir_entry.stat()  # Cached on the entry (already known on Windows)
+                except OSError:
+                    file_stat = None  # Let create_or_update_subpage report the problem
+                return self.create_or_update_subpage(file_path, project_root, force_update, use_plain_text, update_mode, language,
+                                                     file_stat, f"[{i}/{total_files}] ")
+            
+            executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+            try:
+                results = executor.map(sync_file, enumerate(source_entries, 1), languages)
+                for i, (language, page_id) in enumerate(zip(languages, results), 1):
+                    if page_id:
+                        success_count += 1
+                        # Statistics for language type
+                        language_stats[language] = language_stats.get(language, 0) + 1
+                    
+                    # Checkpoint so an interrupted sync keeps the work done so far
+                    if i % CACHE_SAVE_INTERVAL == 0:
+                        self._save_sync_cache(cache_file, verbose=False)
+            finally:
+                # On Ctrl-C or an error, drop the files still queued (running ones finish),
+                # then save the cache so pages already created are not created again next run
+                executor.shutdown(wait=True, cancel_futures=True)
+                self._save_sync_cache(cache_file)
             
             print("=" * 60)
             print(f"✨ Sync completed: {success_count}/{len(source_files)} files synced successfully")
@@ -442,9 +657,6 @@ class NotionSync:
                 for lang, count in sorted(language_stats.items()):
                     print(f"   {lang.title()}: {count} files")
             
-            # Save cache
-            self._save_sync_cache(cache_file)
-            
         except Exception as e:
             print(f"Project sync failed: {str(e)}")
     
@@ -462,7 +674,7 @@ class NotionSync:
             Config.load_env_from_path(project_path)
             self.notion_token = Config.NOTION_TOKEN
             self.parent_page_id = Config.PARENT_PAGE_ID
-            self.notion = Client(auth=self.notion_token)
+            self._refresh_client()
             
             cache_file = self.load_cache_for_project(project_path)
             
@@ -481,50 +693,114 @@ class NotionSync:
             print(f"📥 Pulling files to: {output_dir}")
             print("=" * 60)
             
-            success_count = 0
             total_files = len(self.sync_cache)
             
-            for i, (relative_path, cache_data) in enumerate(self.sync_cache.items(), 1):
-                page_id = cache_data.get('page_id')
-                if not page_id:
-                    continue
-                
-                print(f"[{i}/{total_files}] Pulling {relative_path}...")
-                
-                try:
-                    # Create output file path
-                    output_file = output_dir / relative_path
-                    
-                    # Check if file exists and force_overwrite is False
-                    if output_file.exists() and not force_overwrite:
-                        print(f"⏭️  Skipping {relative_path} (file exists, use -f to overwrite)")
-                        continue
-                    
-                    # Get page content
-                    content = self._extract_code_from_page(page_id)
-                    if content is None:
-                        print(f"❌ Failed to extract content from {relative_path}")
-                        continue
-                    
-                    output_file.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    # Write content to file
-                    with open(output_file, 'w', encoding='utf-8') as f:
-                        f.write(content)
-                    
-                    print(f"✅ Pulled {relative_path}")
-                    success_count += 1
-                    
-                except Exception as e:
-                    print(f"❌ Failed to pull {relative_path}: {str(e)}")
+            # Each file waits on Notion (rate-limited), so fetch and write several files concurrently
+            def pull_file(numbered_item):
+                i, (relative_path, cache_data) = numbered_item
+                return self._pull_file(relative_path, cache_data, output_dir, force_overwrite, f"[{i}/{total_files}] ")
+            
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                results = list(executor.map(pull_file, enumerate(self.sync_cache.items(), 1)))
+            
+            success_count = sum(1 for pulled, _ in results if pulled)
+            cache_changed = any(recorded for _, recorded in results)
             
             print("=" * 60)
             print(f"✨ Pull completed: {success_count}/{total_files} files pulled successfully")
             print(f"📁 Output directory: {output_dir}")
             
+            if cache_changed:
+                self._save_sync_cache(cache_file)
+            
         except Exception as e:
             print(f"Pull operation failed: {str(e)}")
     
+    def _pull_file(self, relative_path, cache_data, output_dir, force_overwrite, progress=""):
+        """
+        Pull one cached file from its Notion page into output_dir
+        
+        Args:
+            relative_path: Cached relative file path
+            cache_data: Cache entry for the file
+            output_dir: Output directory Path
+            force_overwrite: Whether to overwrite an existing local file
+            progress: Progress prefix for the log line
+            
+        Returns:
+            tuple: (pulled, recorded) - whether the local file is up to date, and whether
+                   the cache entry was updated with the pulled page version
+        """
+        page_id = cache_data.get('page_id')
+        if not page_id:
+            return False, False
+        
+        print(f"{progress}Pulling {relative_path}...")
+        
+        try:
+            # Create output file path
+            output_file = output_dir / relative_path
+            
+            last_edited = None
+            if output_file.exists():
+                # Check if file exists and force_overwrite is False
+                if not force_overwrite:
+                    print(f"⏭️  Skipping {relative_path} (file exists, use -f to overwrite)")
+                    return False, False
+                
+                # Cheap probe: page not edited since it was pulled into this (untouched) file
+                last_edited = self._get_page_last_edited(page_id)
+                if (last_edited
+                        and cache_data.get('pulled_edit_time') == last_edited
+                        and cache_data.get('pulled_mtime_ns') == output_file.stat().st_mtime_ns):
+                    print(f"⏭️  Skipping {relative_path} (unchanged in Notion since last pull)")
+                    return True, False
+            
+            # Get page content
+            content = self._extract_code_from_page(page_id)
+            if content is None:
+                print(f"❌ Failed to extract content from {relative_path}")
+                return False, False
+            
+            output_file.parent.mkdir(parents=True, exist_ok=True)
+            
+            # Write content to file
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            
+            # Remember the pulled page version once its edit time can no longer change
+            recorded = False
+            if last_edited and self._is_edit_time_settled(last_edited):
+                with self._cache_lock:
+                    cache_data['pulled_edit_time'] = last_edited
+                    cache_data['pulled_mtime_ns'] = output_file.stat().st_mtime_ns
+                recorded = True
+            
+            print(f"✅ Pulled {relative_path}")
+            return True, recorded
+            
+        except Exception as e:
+            print(f"❌ Failed to pull {relative_path}: {str(e)}")
+            return False, False
+    
+    def _get_page_last_edited(self, page_id):
+        """Return the page's last_edited_time, or None if it cannot be retrieved"""
+        try:
+            return self._call_api(self.notion.pages.retrieve, page_id=page_id).get('last_edited_time')
+        except Exception:
+            return None
+    
+    def _is_edit_time_settled(self, last_edited):
+        """
+        Notion reports last_edited_time rounded down to the minute, so an edit made later in
+        the same minute would not change it. Only trust it once that minute has passed.
+        """
+        try:
+            edited = datetime.fromisoformat(last_edited.replace('Z', '+00:00'))
+        except ValueError:
+            return False
+        return datetime.now(timezone.utc) - edited >= timedelta(minutes=1)
+    
     def _extract_code_from_page(self, page_id):
         """
         Extract code content from Notion page
@@ -536,17 +812,15 @@ class NotionSync:
             str|None: Extracted code content or None if failed
         """
         try:
-            blocks = self.notion.blocks.children.list(block_id=page_id)
             code_parts = []
             
-            for block in blocks["results"]:
+            # Follow pagination: files with more than 100 blocks would otherwise be cut short
+            for block in self._iter_child_blocks(page_id):
                 if block["type"] == "code":
                     code_block = block["code"]
                     if code_block["rich_text"]:
-                        code_content = ""
-                        for text_obj in code_block["rich_text"]:
-                            code_content += text_obj["text"]["content"]
-                        code_parts.append(code_content)
+                        # join instead of += in a loop: repeated str += can degrade to O(n^2) copying
+                        code_parts.append(''.join(text_obj["text"]["content"] for text_obj in code_block["rich_text"]))
             
             if code_parts:
                 return '\n'.join(code_parts)
@@ -567,11 +841,9 @@ class NotionSync:
             language: Programming language name (e.g., 'python', 'c#')
             force_update: Whether to force update
         """
-        # Find corresponding file extensions
-        extensions = []
-        for ext, lang in Config.SUPPORTED_LANGUAGES.items():
-            if lang.lower() == language.lower():
-                extensions.append(ext)
+        # Find corresponding file extensions (SUPPORTED_LANGUAGES values are already lowercase)
+        language_lower = language.lower()
+        extensions = [ext for ext, lang in Config.SUPPORTED_LANGUAGES.items() if lang == language_lower]
         
         if not extensions:
             print(f"❌ Unsupported programming language: {language}")
@@ -592,12 +864,21 @@ class NotionSync:
                 return {}
         return {}
     
-    def _save_sync_cache(self, cache_file):
-        """Save sync cache to specific file"""
+    def _save_sync_cache(self, cache_file, verbose=True):
+        """Save sync cache to specific file (atomically, via a temporary file and rename)"""
+        tmp_file = f"{cache_file}.tmp"
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.sync_cache, f, indent=2, ensure_ascii=False)
-            print(f"💾 Cache saved to {cache_file}")
+            # Workers may still be updating the cache, so serialize under the cache lock
+            with self._cache_lock:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    # Compact separators: no indentation whitespace to encode or write
+                    json.dump(self.sync_cache, f, ensure_ascii=False, separators=(',', ':'))
+                    # Data must be on disk before the rename, or a crash can leave an empty cache file
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp_file, cache_file)
+            if verbose:
+                print(f"💾 Cache saved to {cache_file}")
         except Exception as e:
             print(f"Failed to save cache: {str(e)}")
     
@@ -611,10 +892,18 @@ class NotionSync:
         project_root = Path(project_path).resolve()
         to_remove = []
         
-        for relative_path in self.sync_cache.keys():
+        # List each cached directory once and check names with set lookups (instead of one stat per entry)
+        entries_by_dir = defaultdict(list)
+        for relative_path in self.sync_cache:
             full_path = project_root / relative_path
-            if not full_path.exists():
-                to_remove.append(relative_path)
+            entries_by_dir[full_path.parent].append((full_path.name, relative_path))
+        
+        for directory, entries in entries_by_dir.items():
+            try:
+                existing_names = set(os.listdir(directory))
+            except (FileNotFoundError, NotADirectoryError):
+                existing_names = set()  # Whole directory was removed
+            to_remove.extend(relative_path for name, relative_path in entries if name not in existing_names)
         
         for relative_path in to_remove:
             del self.sync_cache[relative_path]
@@ -645,9 +934,7 @@ class NotionSync:
             
             # Check sync status
             try:
-                project_root_path = Path(project_path).resolve()
-                file_absolute_path = Path(file_path).resolve()
-                relative_path = str(file_absolute_path.relative_to(project_root_path))
+                relative_path = str(file_path.relative_to(project_root))
             except ValueError:
                 # 同樣的修正：使用完整路徑確保一致性
                 relative_path = str(Path(file_path).resolve())
@@ -0,0 +1,71 @@
+import threading
+import time
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+# Retries for rate-limited (429), conflicting (409) and server-side (5xx) API responses
+API_MAX_RETRIES = 3
+API_RETRY_BASE_DELAY = 1.0  # seconds, doubled on each retry unless Notion sends Retry-After
+
+
+class RateLimiter:
+    """Thread-safe token-bucket rate limiter shared by the Notion API callers"""
+
+    def __init__(self, rate, burst=1):
+        """
+        Args:
+            rate: Requests allowed per second
+            burst: Requests that may be issued back-to-back before spacing kicks in
+                   (1 = evenly spaced, one request every 1/rate seconds)
+        """
+        self._interval = 1.0 / rate
+        self._burst_allowance = (burst - 1) * self._interval
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """Block until the next request may be sent"""
+        with self._lock:
+            now = time.monotonic()
+            next_time = max(now, self._next_time)
+            wait_time = next_time - now - self._burst_allowance
+            self._next_time = next_time + self._interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+def call_with_retry(rate_limiter, method, idempotent=True, **kwargs):
+    """
+    Call a Notion API method under rate_limiter, retrying with exponential backoff
+    
+    Args:
+        rate_limiter: Limiter to wait on before each attempt
+        method: Bound notion_client endpoint method (e.g. notion.pages.create)
+        idempotent: Whether the call may be repeated after a timeout or server error.
+                    Creates and appends may have been applied before the failure, so
+                    they are only retried when Notion rejected them with 429.
+        **kwargs: Arguments for the API method
+        
+    Returns:
+        dict: API response
+    """
+    for attempt in range(API_MAX_RETRIES + 1):
+        rate_limiter.wait()
+        try:
+            return method(**kwargs)
+        except (HTTPResponseError, RequestTimeoutError) as e:
+            status = getattr(e, 'status', None)
+            if status == 429:
+                retryable = True
+            else:
+                retryable = idempotent and (status is None or status == 409 or status >= 500)
+            if not retryable or attempt == API_MAX_RETRIES:
+                raise
+            
+            delay = API_RETRY_BASE_DELAY * 2 ** attempt
+            if status == 429:
+                try:
+                    delay = max(delay, float(e.headers.get('Retry-After', 0)))
+                except ValueError:
+                    pass
+            print(f"⚠️ Notion API request failed ({e}), retrying in {delay:.0f}s...")
+            time.sleep(delay)
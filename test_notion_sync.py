@@ -1,11 +1,16 @@
 import unittest
 import tempfile
+import hashlib
 import shutil
 import os
-import json
+import time
 from pathlib import Path
-from unittest.mock import Mock, patch, MagicMock, call
+from unittest.mock import Mock, patch
+import httpx
+from notion_client.errors import APIErrorCode, APIResponseError
 from notion_sync import NotionSync
+from block_merger import BlockMerger
+from cleanup_tool import NotionCleanupTool
 from config import Config
 
 class TestShouldIgnorePath(unittest.TestCase):
@@ -69,12 +74,161 @@ class TestShouldIgnorePath(unittest.TestCase):
     def test_normal_nested_file(self):
         self.assertFalse(Config.should_ignore_path("/project/src/utils/helper.py"))
 
+    # --- input types ---
+
+    def test_path_object_input(self):
+        self.assertTrue(Config.should_ignore_path(Path("/project/build/output.py")))
+        self.assertFalse(Config.should_ignore_path(Path("/project/src/build_utils.py")))
+    def test_windows_separator_string(self):
+        self.assertTrue(Config.should_ignore_path("C:\\project\\node_modules\\lodash\\index.js"))
+        self.assertFalse(Config.should_ignore_path("C:\\project\\src\\main.py"))
+
     # --- case sensitivity ---
 
     def test_uppercase_BUILD_directory(self):
         # exact match is case-sensitive; change if you add case-insensitive matching
         self.assertFalse(Config.should_ignore_path("/project/BUILD/output.py"))
 
+class TestShouldIgnoreDirname(unittest.TestCase):
+    """Tests for Config.should_ignore_dirname() - single-segment fast path"""
+
+    def test_ignored_directory_names(self):
+        for name in ("node_modules", ".git", "build", "__pycache__"):
+            self.assertTrue(Config.should_ignore_dirname(name), name)
+    def test_regular_directory_names(self):
+        for name in ("src", "rebuild_scripts", "target_env", "BUILD"):
+            self.assertFalse(Config.should_ignore_dirname(name), name)
+
+class TestNormalizePageId(unittest.TestCase):
+    """Config.normalize_page_id formats 32 hex characters as 8-4-4-4-12, ignoring hyphens and keeping case"""
+    CANONICAL = "12345678-9abc-def0-1234-56789abcdef0"
+
+    def test_hex_ids_are_normalized(self):
+        for raw in ("123456789abcdef0123456789abcdef0", self.CANONICAL,
+                    "1234-56789abcdef0123456789abcdef0", "Projects-123456789abcdef0123456789abcdef0"):
+            self.assertEqual(Config.normalize_page_id(raw), self.CANONICAL, raw)
+
+    def test_case_is_preserved(self):
+        self.assertEqual(Config.normalize_page_id("123456789ABCDEF0123456789abcdef0"),
+                         "12345678-9ABC-DEF0-1234-56789abcdef0")
+
+    def test_uuid_constructor_extensions_are_rejected(self):
+        for raw in ("{" + self.CANONICAL + "}", "urn:uuid:" + self.CANONICAL,
+                    "1234+5678-9abc-def0-1234-56789abcdef0", "12345678_9abc_def0_1234_56789abcdef0",
+                    self.CANONICAL + "\n"):
+            normalized = Config.normalize_page_id(raw)
+            self.assertEqual(normalized, raw)
+            self.assertFalse(Config._is_valid_page_id(normalized), raw)
+
+class TestBlockMergerSplitContent(unittest.TestCase):
+    """BlockMerger._split_content must split only at '\\n' so merged blocks rejoin losslessly"""
+    def setUp(self):
+        with patch('block_merger.Client'):
+            self.merger = BlockMerger("test_token")
+        self.merger.MAX_CHUNK_SIZE = 10
+
+    def test_form_feed_and_line_separator_survive_split(self):
+        content = "ab\x0ccd\nef\u2028gh\nij\x0ckl\u2029mn\n\x0c\n" + "x\u2028" * 8
+        chunks = self.merger._split_content(content)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual('\n'.join(chunks), content)
+
+class TestBlockMergerApiCalls(unittest.TestCase):
+    """BlockMerger sends every Notion call through the shared rate limiter and retry helper"""
+    def setUp(self):
+        with patch('block_merger.Client'):
+            self.merger = BlockMerger("test_token")
+        self.merger.notion = Mock()
+        self.merger._rate_limiter = Mock()
+        code = lambda block_id, text: {"id": block_id, "type": "code",
+                                       "code": {"language": "python", "rich_text": [{"text": {"content": text}}]}}
+        self.merger.notion.blocks.children.list.return_value = {
+            "results": [{"id": "intro", "type": "paragraph"}, code("c1", "a = 1"), code("c2", "b = 2")],
+            "has_more": False
+        }
+
+    def test_rate_limited_append_is_retried_before_deleting(self):
+        rate_limited = APIResponseError(httpx.Response(429), "rate limited", APIErrorCode.RateLimited)
+        self.merger.notion.blocks.children.append.side_effect = [rate_limited, {"results": [{"id": "merged"}]}]
+        with patch('rate_limiter.time.sleep'):
+            self.assertTrue(self.merger.merge_code_blocks_in_page("page_1"))
+        self.assertEqual(self.merger.notion.blocks.children.append.call_count, 2)
+        deleted = {c.kwargs['block_id'] for c in self.merger.notion.blocks.delete.call_args_list}
+        self.assertEqual(deleted, {"c1", "c2"})
+        # list + two append attempts + two deletes
+        self.assertEqual(self.merger._rate_limiter.wait.call_count, 5)
+
+    def test_server_error_on_append_is_not_retried(self):
+        self.merger.notion.blocks.children.append.side_effect = APIResponseError(
+            httpx.Response(502), "bad gateway", APIErrorCode.InternalServerError)
+        with patch('rate_limiter.time.sleep') as mock_sleep:
+            self.assertFalse(self.merger.merge_code_blocks_in_page("page_1"))
+        self.merger.notion.blocks.children.append.assert_called_once()
+        self.merger.notion.blocks.delete.assert_not_called()
+        mock_sleep.assert_not_called()
+
+class TestCleanupToolScan(unittest.TestCase):
+    """NotionCleanupTool page scans are rate-limited, retried, and never cache failures"""
+    def setUp(self):
+        with patch('cleanup_tool.Client'):
+            self.tool = NotionCleanupTool("test_token")
+        self.tool.notion = Mock()
+        self.tool._rate_limiter = Mock()
+        self.path_blocks = {"results": [{
+            "type": "paragraph",
+            "paragraph": {"rich_text": [{"text": {"content": "📁 Path: /home/user/app.py\n🔤 Language: Python"}}]}
+        }]}
+
+    def test_rate_limited_path_lookup_is_retried(self):
+        rate_limited = APIResponseError(httpx.Response(429), "rate limited", APIErrorCode.RateLimited)
+        self.tool.notion.blocks.children.list.side_effect = [rate_limited, self.path_blocks]
+        with patch('rate_limiter.time.sleep'):
+            self.assertEqual(self.tool._extract_file_path_from_page("page_1"), "/home/user/app.py")
+        self.assertEqual(self.tool._rate_limiter.wait.call_count, 2)
+
+    def test_failed_path_lookup_is_not_cached(self):
+        not_found = APIResponseError(httpx.Response(404), "not found", APIErrorCode.ObjectNotFound)
+        self.tool.notion.blocks.children.list.side_effect = [not_found, self.path_blocks]
+        with self.assertRaises(APIResponseError):
+            self.tool._extract_file_path_from_page("page_1")
+        self.assertEqual(self.tool._extract_file_path_from_page("page_1"), "/home/user/app.py")
+
+    def test_duplicate_report_is_printed_per_page(self):
+        child_pages = [{"id": f"p{n}", "type": "child_page", "child_page": {"title": f"f{n}.py"}} for n in range(30)]
+        self.tool.notion.blocks.children.list.side_effect = (
+            lambda block_id, **kwargs: {"results": child_pages} if block_id == "parent" else self.path_blocks)
+        self.tool.notion.pages.retrieve.return_value = {"created_time": "2024-01-01"}
+        with patch('builtins.print') as mock_print:
+            self.tool.find_true_duplicates_with_path_check("parent")
+        lines = [c.args[0] for c in mock_print.call_args_list]
+        self.assertIn("   ⏳ Scanned 25/30 pages", lines)
+        self.assertIn("   ⏳ Scanned 30/30 pages", lines)
+        self.assertEqual(sum(line.startswith("   📄 ") for line in lines), 30)
+
+    def test_scan_pages_through_all_children(self):
+        child = lambda n: {"id": f"p{n}", "type": "child_page", "child_page": {"title": f"f{n}.py"}}
+        pages = {None: {"results": [child(n) for n in range(100)], "has_more": True, "next_cursor": "cursor_1"},
+                 "cursor_1": {"results": [child(100), {"id": "b", "type": "paragraph"}], "has_more": False}}
+        self.tool.notion.blocks.children.list.side_effect = (
+            lambda block_id, start_cursor=None, **kwargs: pages[start_cursor] if block_id == "parent" else self.path_blocks)
+        self.tool.notion.pages.retrieve.return_value = {}
+        with patch('builtins.print'):
+            scanned = self.tool._scan_children("parent")
+        self.assertEqual([page['id'] for page in scanned], [f"p{n}" for n in range(101)])
+
+    def test_rescan_after_archiving_drops_archived_pages(self):
+        duplicate = lambda page_id: {"id": page_id, "type": "child_page", "child_page": {"title": "app.py"}}
+        children = {"results": [duplicate("new"), duplicate("old")]}
+        self.tool.notion.blocks.children.list.side_effect = (
+            lambda block_id, **kwargs: children if block_id == "parent" else self.path_blocks)
+        created = {"new": "2024-02-01", "old": "2024-01-01"}
+        self.tool.notion.pages.retrieve.side_effect = lambda page_id: {"created_time": created[page_id]}
+        with patch('builtins.print'):
+            duplicates = self.tool.find_true_duplicates_with_path_check("parent")
+            self.assertEqual(self.tool.cleanup_duplicates_path_aware(duplicates), 1)
+            children = {"results": [duplicate("new")]}  # Notion no longer lists the archived page
+            self.assertEqual([page['id'] for page in self.tool._scan_children("parent")], ["new"])
+
 class TestNotionSyncFixed(unittest.TestCase):
     """Unit tests for NotionSync class - Updated for fixed version"""
     def setUp(self):
@@ -82,28 +236,41 @@ class TestNotionSyncFixed(unittest.TestCase):
         self.mock_notion_token = "test_token_123"
         self.mock_parent_page_id = "test_page_id_456"
         self.mock_notion_client = Mock()
+        # Pages start out empty unless a test says otherwise
+        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
+        self.mock_notion_client.blocks.children.append.return_value = {"results": []}
         with patch('notion_sync.Client'):
             self.sync = NotionSync(self.mock_notion_token, self.mock_parent_page_id)
             self.sync.notion = self.mock_notion_client
+            self.sync._rate_limiter = Mock()  # API is mocked, no need to throttle
             self.sync.sync_cache = {}
     def tearDown(self):
-        shutil.rmtree(self.test_dir)
+        shutil.rmtree(self.test_dir, ignore_errors=True)  # Windows may still hold a handle briefly
     def create_test_file(self, filename, content, subdir=""):
-        if subdir:
-            os.makedirs(os.path.join(self.test_dir, subdir), exist_ok=True)
-            file_path = os.path.join(self.test_dir, subdir, filename)
-        else:
-            file_path = os.path.join(self.test_dir, filename)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(content)
-        return Path(file_path)
+        directory = Path(self.test_dir, subdir)
+        directory.mkdir(parents=True, exist_ok=True)
+        file_path = directory / filename
+        file_path.write_text(content, encoding='utf-8')
+        return file_path
+    def archived_page_ids(self):
+        return [c.kwargs['page_id'] for c in self.mock_notion_client.pages.update.call_args_list
+                if c.kwargs.get('archived') is True]
+
+class TestProjectScan(TestNotionSyncFixed):
+    """scan_source_files prunes ignored directories and files during the walk"""
+    def test_scan_prunes_ignored_directories(self):
+        self.create_test_file("app.py", "# app", "src")
+        self.create_test_file("dep.js", "// dep", "node_modules/pkg")
+        self.create_test_file("out.py", "# out", "src/build")
+        self.create_test_file("lib.min.js", "// min", "src")
+        source_files = self.sync.scan_source_files(self.test_dir)
+        self.assertEqual(source_files, [Path(self.test_dir).resolve() / "src" / "app.py"])
 
 class TestFixedRelativePathCalculation(TestNotionSyncFixed):
     """Test the fixed relative path calculation logic"""
     def test_relative_path_success(self):
         test_file = self.create_test_file("test.py", "print('test')", "src")
         self.mock_notion_client.pages.create.return_value = {"id": "page_123"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
         expected_relative_path = str(Path("src/test.py"))  # OS-native separator
         self.assertIn(expected_relative_path, self.sync.sync_cache)
@@ -112,7 +279,6 @@ class TestFixedRelativePathCalculation(TestNotionSyncFixed):
         test_file = self.create_test_file("test.py", "print('test')")
         with patch('pathlib.Path.relative_to', side_effect=ValueError("Not relative")):
             self.mock_notion_client.pages.create.return_value = {"id": "page_456"}
-            self.mock_notion_client.blocks.children.list.return_value = {"results": []}
             page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
             absolute_path = str(test_file.resolve()).replace('\\', '/')
             self.assertIn(absolute_path, self.sync.sync_cache)
@@ -123,7 +289,6 @@ class TestFixedRelativePathCalculation(TestNotionSyncFixed):
             {"id": "page_src_utils"},
             {"id": "page_tests_utils"}
         ]
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id1 = self.sync.create_or_update_subpage(file1, self.test_dir, force_update=True)
         page_id2 = self.sync.create_or_update_subpage(file2, self.test_dir, force_update=True)
         self.assertNotEqual(page_id1, page_id2)
@@ -144,7 +309,6 @@ class TestOldPageDeletionLogic(TestNotionSyncFixed):
         }
         self.mock_notion_client.pages.update.return_value = {}
         self.mock_notion_client.pages.create.return_value = {"id": "new_page_id_456"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
         self.mock_notion_client.pages.update.assert_any_call(
             page_id="old_page_id_123",
@@ -163,7 +327,6 @@ class TestOldPageDeletionLogic(TestNotionSyncFixed):
         }
         self.mock_notion_client.pages.update.side_effect = Exception("Cannot delete")
         self.mock_notion_client.pages.create.return_value = {"id": "new_page_id_999"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
         self.assertEqual(page_id, "new_page_id_999")
         self.mock_notion_client.pages.create.assert_called_once()
@@ -171,11 +334,8 @@ class TestOldPageDeletionLogic(TestNotionSyncFixed):
         test_file = self.create_test_file("brand_new.py", "print('brand new')")
         self.sync.sync_cache = {}
         self.mock_notion_client.pages.create.return_value = {"id": "brand_new_page"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
-        update_calls = [c for c in self.mock_notion_client.pages.update.call_args_list
-                        if c[1].get('archived') is True]
-        self.assertEqual(len(update_calls), 0)
+        self.assertEqual(self.archived_page_ids(), [])
         self.assertEqual(page_id, "brand_new_page")
         self.mock_notion_client.pages.create.assert_called_once()
 
@@ -184,14 +344,11 @@ class TestCacheConsistency(TestNotionSyncFixed):
     def test_cache_key_consistency(self):
         test_file = self.create_test_file("consistency_test.py", "print('test')")
         self.mock_notion_client.pages.create.return_value = {"id": "page_consistent"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id1 = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
         first_cache = self.sync.sync_cache.copy()
         self.mock_notion_client.reset_mock()
         self.mock_notion_client.pages.create.return_value = {"id": "page_consistent_2"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
-        with open(test_file, 'w', encoding='utf-8') as f:
-            f.write("print('updated content')")
+        test_file.write_text("print('updated content')", encoding='utf-8')
         page_id2 = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
         self.assertEqual(list(first_cache.keys()), list(self.sync.sync_cache.keys()))
         cache_key = list(self.sync.sync_cache.keys())[0]
@@ -205,13 +362,11 @@ class TestCacheConsistency(TestNotionSyncFixed):
             'hash': original_hash,
             'last_sync': "2023-01-01T00:00:00"
         }
-        with open(test_file, 'w', encoding='utf-8') as f:
-            f.write("updated content that changes hash")
+        test_file.write_text("updated content that changes hash", encoding='utf-8')
         new_hash = self.sync.get_file_hash(test_file)
         self.assertNotEqual(original_hash, new_hash)
         self.mock_notion_client.pages.update.return_value = {}
         self.mock_notion_client.pages.create.return_value = {"id": "new_page_id"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=False)
         self.mock_notion_client.pages.update.assert_called_with(
             page_id="original_page_id",
@@ -221,6 +376,36 @@ class TestCacheConsistency(TestNotionSyncFixed):
         self.assertEqual(self.sync.sync_cache[relative_path]['page_id'], "new_page_id")
         self.assertEqual(self.sync.sync_cache[relative_path]['hash'], new_hash)
 
+    def test_get_file_hash_large_file_paths_agree(self):
+        data = os.urandom(5 * 1024 * 1024)
+        large_file = Path(self.test_dir) / "large.bin"
+        large_file.write_bytes(data)
+        expected = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self.assertEqual(self.sync.get_file_hash(large_file), expected)
+        with patch('notion_sync.mmap.mmap', side_effect=OSError("cannot map")):
+            self.assertEqual(self.sync.get_file_hash(large_file), expected)
+
+class TestSplitContentBoundaries(TestNotionSyncFixed):
+    """NotionSync._split_content boundaries: over-long lines, exact-size content and lossless rejoin"""
+    def test_line_longer_than_max_size_is_kept_whole(self):
+        long_line = "x" * 25
+        chunks = self.sync._split_content(f"short\n{long_line}\nend", 10)
+        self.assertEqual(chunks, ["short", long_line, "end"])
+
+    def test_content_exactly_max_size(self):
+        self.assertEqual(self.sync._split_content("abcd\nefghi", 10), ["abcd", "efghi"])
+        self.assertEqual(self.sync._split_content("x" * 10, 10), ["x" * 10])
+        self.assertEqual(self.sync._split_content("abcd\nefgh", 10), ["abcd\nefgh"])
+
+    def test_chunks_rejoin_to_original(self):
+        lines = [("line %d " % n) * (n % 7) for n in range(200)]
+        content = "\n".join(lines) + "\n"
+        for max_size in (1, 10, 37, 100, len(content), len(content) + 1):
+            chunks = self.sync._split_content(content, max_size)
+            self.assertEqual("\n".join(chunks), content)
+            for chunk in chunks:
+                self.assertTrue(len(chunk) <= max_size or "\n" not in chunk, (max_size, chunk))
+
 class TestCrossPlatformPathHandling(TestNotionSyncFixed):
     """Test cross-platform path handling improvements"""
     def test_windows_path_normalization(self):
@@ -228,7 +413,6 @@ class TestCrossPlatformPathHandling(TestNotionSyncFixed):
         with patch('pathlib.Path.relative_to') as mock_relative:
             mock_relative.return_value = Path("src\\utils\\path_test.py")
             self.mock_notion_client.pages.create.return_value = {"id": "path_page"}
-            self.mock_notion_client.blocks.children.list.return_value = {"results": []}
             page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
             cache_keys = list(self.sync.sync_cache.keys())
             normalized_key = [k for k in cache_keys
@@ -238,7 +422,6 @@ class TestCrossPlatformPathHandling(TestNotionSyncFixed):
         test_file = self.create_test_file("fallback_test.py", "print('fallback')")
         with patch('pathlib.Path.relative_to', side_effect=ValueError("Path not relative")):
             self.mock_notion_client.pages.create.return_value = {"id": "fallback_page"}
-            self.mock_notion_client.blocks.children.list.return_value = {"results": []}
             page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
             absolute_path = str(test_file.resolve()).replace('\\', '/')
             self.assertIn(absolute_path, self.sync.sync_cache)
@@ -255,16 +438,11 @@ class TestPageDeletionAndRecreation(TestNotionSyncFixed):
             'hash': old_hash,
             'last_sync': "2023-01-01T00:00:00"
         }
-        with open(test_file, 'w', encoding='utf-8') as f:
-            f.write("updated content")
+        test_file.write_text("updated content", encoding='utf-8')
         self.mock_notion_client.pages.update.return_value = {}
         self.mock_notion_client.pages.create.return_value = {"id": "new_archived_page"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=False)
-        archive_calls = [c for c in self.mock_notion_client.pages.update.call_args_list
-                         if c[1].get('archived') is True]
-        self.assertEqual(len(archive_calls), 1)
-        self.assertEqual(archive_calls[0][1]['page_id'], "old_page_to_archive")
+        self.assertEqual(self.archived_page_ids(), ["old_page_to_archive"])
         self.mock_notion_client.pages.create.assert_called_once()
         self.assertEqual(self.sync.sync_cache[relative_path]['page_id'], "new_archived_page")
     def test_handle_archive_failure_gracefully(self):
@@ -277,20 +455,92 @@ class TestPageDeletionAndRecreation(TestNotionSyncFixed):
         }
         self.mock_notion_client.pages.update.side_effect = Exception("Archive failed")
         self.mock_notion_client.pages.create.return_value = {"id": "new_page_despite_failure"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
         self.assertEqual(page_id, "new_page_despite_failure")
         self.mock_notion_client.pages.create.assert_called_once()
-    def test_no_unnecessary_deletion_for_new_files(self):
-        test_file = self.create_test_file("brand_new.py", "print('brand new')")
-        self.sync.sync_cache = {}
-        self.mock_notion_client.pages.create.return_value = {"id": "brand_new_page"}
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
-        page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
-        archive_calls = [c for c in self.mock_notion_client.pages.update.call_args_list
-                         if c[1].get('archived') is True]
-        self.assertEqual(len(archive_calls), 0)
-        self.assertEqual(page_id, "brand_new_page")
+
+    def test_clear_mode_updates_same_layout_in_place(self):
+        test_file = self.create_test_file("in_place.py", "print('v2')")
+        self.sync.sync_cache["in_place.py"] = {
+            'page_id': "kept_page",
+            'hash': "old_hash",
+            'block_ids': ["b1", "b2", "b3", "b4"]
+        }
+        self.mock_notion_client.blocks.children.list.return_value = {
+            "results": [{"id": block_id} for block_id in ["b1", "b2", "b3", "b4"]]
+        }
+        page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True, update_mode='clear')
+        self.assertEqual(page_id, "kept_page")
+        self.assertEqual(self.mock_notion_client.blocks.update.call_count, 4)
+        self.mock_notion_client.blocks.delete.assert_not_called()
+        self.mock_notion_client.blocks.children.append.assert_not_called()
+        self.assertEqual(self.sync.sync_cache["in_place.py"]['block_ids'], ["b1", "b2", "b3", "b4"])
+
+    def test_clear_mode_rewrites_page_whose_children_differ_from_cache(self):
+        test_file = self.create_test_file("edited.py", "print('v2')")
+        self.sync.sync_cache["edited.py"] = {
+            'page_id': "kept_page",
+            'hash': "old_hash",
+            'block_ids': ["b1", "b2", "b3", "b4"]
+        }
+        # A block was added in Notion since the last sync
+        self.mock_notion_client.blocks.children.list.return_value = {
+            "results": [{"id": block_id} for block_id in ["b1", "b2", "b3", "b4", "user_block"]]
+        }
+        self.mock_notion_client.blocks.children.append.return_value = {
+            "results": [{"id": block_id} for block_id in ["n1", "n2", "n3", "n4"]]
+        }
+        page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True, update_mode='clear')
+        self.assertEqual(page_id, "kept_page")
+        self.mock_notion_client.blocks.update.assert_not_called()
+        deleted = {c.kwargs['block_id'] for c in self.mock_notion_client.blocks.delete.call_args_list}
+        self.assertEqual(deleted, {"b1", "b2", "b3", "b4", "user_block"})
+        self.mock_notion_client.blocks.children.append.assert_called_once()
+        self.assertEqual(self.sync.sync_cache["edited.py"]['block_ids'], ["n1", "n2", "n3", "n4"])
+
+    def test_new_page_is_not_listed_for_clearing(self):
+        test_file = self.create_test_file("fresh.py", "print('fresh')")
+        self.mock_notion_client.pages.create.return_value = {"id": "fresh_page"}
+        self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
+        self.mock_notion_client.blocks.children.list.assert_not_called()
+        self.mock_notion_client.blocks.children.append.assert_called_once()
+
+class TestCleanDeletedFiles(TestNotionSyncFixed):
+    """clean_deleted_files drops cache entries for files no longer on disk"""
+    def test_clean_deleted_files_removes_only_missing_entries(self):
+        self.create_test_file("kept.py", "# kept", "src")
+        self.sync.sync_cache = {
+            str(Path("src/kept.py")): {'page_id': "kept_page"},
+            str(Path("src/gone.py")): {'page_id': "gone_page"},
+            str(Path("removed_dir/old.py")): {'page_id': "old_page"},
+        }
+        with patch.object(self.sync, 'load_cache_for_project', return_value=Path(self.test_dir) / "cache.json"):
+            self.sync.clean_deleted_files(self.test_dir)
+        self.assertEqual(list(self.sync.sync_cache), [str(Path("src/kept.py"))])
+
+class TestCallApiRetry(TestNotionSyncFixed):
+    """_call_api retries rate limits always, and server errors only for idempotent calls"""
+    def test_rate_limited_append_is_retried(self):
+        test_file = self.create_test_file("retry.py", "print('retry')")
+        self.mock_notion_client.pages.create.return_value = {"id": "retry_page"}
+        rate_limited = APIResponseError(httpx.Response(429, headers={"Retry-After": "2"}),
+                                        "rate limited", APIErrorCode.RateLimited)
+        self.mock_notion_client.blocks.children.append.side_effect = [rate_limited, {"results": []}]
+        with patch('rate_limiter.time.sleep') as mock_sleep:
+            page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
+        self.assertEqual(page_id, "retry_page")
+        self.assertEqual(self.mock_notion_client.blocks.children.append.call_count, 2)
+        mock_sleep.assert_called_once_with(2.0)
+
+    def test_server_error_on_create_is_not_retried(self):
+        test_file = self.create_test_file("no_retry.py", "print('no retry')")
+        self.mock_notion_client.pages.create.side_effect = APIResponseError(
+            httpx.Response(502), "bad gateway", APIErrorCode.InternalServerError)
+        with patch('rate_limiter.time.sleep') as mock_sleep:
+            page_id = self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
+        self.assertIsNone(page_id)
+        self.mock_notion_client.pages.create.assert_called_once()
+        mock_sleep.assert_not_called()
 
 class TestSkipLogicWithNewChanges(TestNotionSyncFixed):
     """Test that skip logic still works correctly with the new changes"""
@@ -308,6 +558,116 @@ class TestSkipLogicWithNewChanges(TestNotionSyncFixed):
         self.mock_notion_client.pages.create.assert_not_called()
         self.mock_notion_client.pages.update.assert_not_called()
         self.mock_notion_client.blocks.children.list.assert_not_called()
+    def test_skip_unchanged_stat_without_hashing(self):
+        test_file = self.create_test_file("stat_only.py", "print('stat')")
+        self.mock_notion_client.pages.create.return_value = {"id": "stat_page"}
+        self.sync.create_or_update_subpage(test_file, self.test_dir)
+        with patch('notion_sync._new_file_hasher') as mock_hasher:
+            page_id = self.sync.create_or_update_subpage(test_file, self.test_dir)
+        self.assertEqual(page_id, "stat_page")
+        mock_hasher.assert_not_called()
+        self.mock_notion_client.pages.create.assert_called_once()
+
+    def test_legacy_md5_entry_is_migrated_without_resync(self):
+        test_file = self.create_test_file("legacy.py", "print('legacy')")
+        self.sync.sync_cache["legacy.py"] = {
+            'page_id': "legacy_page",
+            'hash': hashlib.md5(test_file.read_bytes()).hexdigest()
+        }
+        page_id = self.sync.create_or_update_subpage(test_file, self.test_dir)
+        self.assertEqual(page_id, "legacy_page")
+        self.mock_notion_client.pages.create.assert_not_called()
+        entry = self.sync.sync_cache["legacy.py"]
+        self.assertEqual(entry['hash'], self.sync.get_file_hash(test_file))
+        self.assertEqual(entry['hash_algo'], 'blake2b')
+
+    def test_stale_legacy_entry_reads_file_once(self):
+        test_file = self.create_test_file("stale.py", "print('stale')")
+        self.sync.sync_cache["stale.py"] = {'page_id': "stale_page", 'hash': "0" * 32}
+        self.mock_notion_client.pages.create.return_value = {"id": "new_stale_page"}
+        with patch('notion_sync.open', create=True, side_effect=open) as mock_open:
+            page_id = self.sync.create_or_update_subpage(test_file, self.test_dir)
+        self.assertEqual(page_id, "new_stale_page")
+        self.assertEqual([c.args[0] for c in mock_open.call_args_list], [test_file])
+
+    def test_changed_file_is_not_hashed_through_get_file_hash(self):
+        test_file = self.create_test_file("changed.py", "print('changed')")
+        self.sync.sync_cache["changed.py"] = {'page_id': "changed_page", 'hash': "0" * 32, 'hash_algo': 'blake2b'}
+        self.mock_notion_client.pages.create.return_value = {"id": "changed_page_v2"}
+        with patch.object(self.sync, 'get_file_hash') as mock_get_file_hash:
+            self.sync.create_or_update_subpage(test_file, self.test_dir)
+        mock_get_file_hash.assert_not_called()
+        self.assertEqual(self.sync.sync_cache["changed.py"]['hash'],
+                         hashlib.blake2b(test_file.read_bytes(), digest_size=16).hexdigest())
+
+    def test_forced_pull_skips_page_unchanged_since_last_pull(self):
+        output_dir = Path(self.test_dir) / "out"
+        pulled = self.create_test_file("pulled.py", "print('pulled')", "out")
+        self.sync.sync_cache = {"pulled.py": {
+            'page_id': "pulled_page",
+            'pulled_edit_time': "2024-01-01T10:00:00.000Z",
+            'pulled_mtime_ns': pulled.stat().st_mtime_ns
+        }}
+        self.mock_notion_client.pages.retrieve.return_value = {"last_edited_time": "2024-01-01T10:00:00.000Z"}
+        with patch.object(Config, 'load_env_from_path'), \
+             patch.object(self.sync, '_refresh_client'), \
+             patch.object(self.sync, 'load_cache_for_project', return_value=Path(self.test_dir) / "cache.json"):
+            self.sync.pull_from_notion(self.test_dir, output_dir=output_dir, force_overwrite=True)
+        self.mock_notion_client.blocks.children.list.assert_not_called()
+
+class TestChildBlockPagination(TestNotionSyncFixed):
+    """Pages with more than one page of children are read and cleared completely"""
+    def paginate(self, blocks, page_size=100):
+        pages = [blocks[i:i + page_size] for i in range(0, len(blocks), page_size)]
+        return [{"results": page, "has_more": n < len(pages) - 1, "next_cursor": f"cursor_{n + 1}" if n < len(pages) - 1 else None}
+                for n, page in enumerate(pages)]
+
+    def test_pull_reads_code_from_every_page_of_children(self):
+        code_blocks = [{"id": f"c{n}", "type": "code", "code": {"rich_text": [{"text": {"content": f"line {n}"}}]}}
+                       for n in range(150)]
+        self.mock_notion_client.blocks.children.list.side_effect = self.paginate(code_blocks)
+        content = self.sync._extract_code_from_page("paged_page")
+        self.assertEqual(content, '\n'.join(f"line {n}" for n in range(150)))
+        list_calls = self.mock_notion_client.blocks.children.list.call_args_list
+        self.assertEqual([c.kwargs['start_cursor'] for c in list_calls], [None, "cursor_1"])
+
+    def test_clear_mode_deletes_every_page_of_children(self):
+        test_file = self.create_test_file("paged.py", "print('paged')")
+        self.sync.sync_cache["paged.py"] = {'page_id': "paged_page", 'hash': "old_hash"}
+        old_blocks = [{"id": f"old{n}", "type": "paragraph"} for n in range(150)]
+        self.mock_notion_client.blocks.children.list.side_effect = self.paginate(old_blocks)
+        self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True, update_mode='clear')
+        deleted = {c.kwargs['block_id'] for c in self.mock_notion_client.blocks.delete.call_args_list}
+        self.assertEqual(deleted, {block["id"] for block in old_blocks})
+        self.mock_notion_client.blocks.children.append.assert_called_once()
+
+class TestSourceDecoding(TestNotionSyncFixed):
+    """Uploaded code text for files in different encodings and line endings"""
+    def sync_bytes(self, filename, data):
+        test_file = Path(self.test_dir) / filename
+        test_file.write_bytes(data)
+        self.mock_notion_client.pages.create.return_value = {"id": "decoded_page"}
+        self.sync.create_or_update_subpage(test_file, self.test_dir, force_update=True)
+        children = self.mock_notion_client.blocks.children.append.call_args.kwargs['children']
+        code_blocks = [block for block in children if block["type"] == "code"]
+        self.assertEqual(len(code_blocks), 1)
+        return [part["text"]["content"] for part in code_blocks[0]["code"]["rich_text"]]
+
+    def test_utf8_bom_file_keeps_bom_character(self):
+        rich_text = self.sync_bytes("bom.py", b'\xef\xbb\xbfprint("\xe4\xbd\xa0\xe5\xa5\xbd")\n')
+        self.assertEqual(rich_text, ['\ufeffprint("你好")\n'])
+
+    def test_utf16_bom_file_is_decoded(self):
+        rich_text = self.sync_bytes("wide.cs", 'var s = "你好";\n'.encode('utf-16'))
+        self.assertEqual(rich_text, ['var s = "你好";\n'])
+
+    def test_non_utf8_file_falls_back_to_gbk(self):
+        rich_text = self.sync_bytes("legacy.py", '# 中文註解\nprint(1)\n'.encode('gbk'))
+        self.assertEqual(rich_text, ['# 中文註解\nprint(1)\n'])
+
+    def test_crlf_line_endings_are_normalized(self):
+        rich_text = self.sync_bytes("windows.py", b'a = 1\r\nb = 2\rc = 3\r\n')
+        self.assertEqual(rich_text, ['a = 1\nb = 2\nc = 3\n'])
 
 class TestIntegrationScenarios(TestNotionSyncFixed):
     """Test realistic integration scenarios"""
@@ -320,7 +680,6 @@ class TestIntegrationScenarios(TestNotionSyncFixed):
             {"id": "helper_utils"},
             {"id": "helper_tests"}
         ]
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         page_ids = []
         for file_path in [file1, file2, file3]:
             page_id = self.sync.create_or_update_subpage(file_path, self.test_dir, force_update=True)
@@ -344,27 +703,53 @@ class TestIntegrationScenarios(TestNotionSyncFixed):
             'hash': existing_hash,
             'last_sync': "2023-01-01T00:00:00"
         }
-        with open(existing_file, 'w', encoding='utf-8') as f:
-            f.write("new content")
+        existing_file.write_text("new content", encoding='utf-8')
         new_file = self.create_test_file("brand_new.py", "brand new content")
         self.mock_notion_client.pages.update.return_value = {}
         self.mock_notion_client.pages.create.side_effect = [
             {"id": "updated_existing_page"},
             {"id": "brand_new_page"}
         ]
-        self.mock_notion_client.blocks.children.list.return_value = {"results": []}
         existing_result = self.sync.create_or_update_subpage(existing_file, self.test_dir, force_update=False)
         new_result = self.sync.create_or_update_subpage(new_file, self.test_dir, force_update=False)
-        archive_calls = [c for c in self.mock_notion_client.pages.update.call_args_list
-                         if c[1].get('archived') is True]
-        self.assertEqual(len(archive_calls), 1)
-        self.assertEqual(archive_calls[0][1]['page_id'], "existing_page_id")
+        self.assertEqual(self.archived_page_ids(), ["existing_page_id"])
         self.assertEqual(self.mock_notion_client.pages.create.call_count, 2)
         self.assertEqual(existing_result, "updated_existing_page")
         self.assertEqual(new_result, "brand_new_page")
         self.assertEqual(len(self.sync.sync_cache), 2)
         self.assertEqual(self.sync.sync_cache["existing.py"]['page_id'], "updated_existing_page")
         self.assertEqual(self.sync.sync_cache["brand_new.py"]['page_id'], "brand_new_page")
+    def test_interrupted_sync_stops_queued_files_and_saves_cache(self):
+        for n in range(30):
+            self.create_test_file(f"file_{n:02}.py", f"# {n}")
+        def create_or_update(file_path, *args):
+            if file_path.name == "file_00.py":
+                raise KeyboardInterrupt
+            time.sleep(0.1)
+            return "page"
+        with patch.object(Config, 'load_env_from_path'), \
+             patch.object(self.sync, '_refresh_client'), \
+             patch.object(self.sync, 'load_cache_for_project', return_value=Path(self.test_dir) / "cache.json"), \
+             patch.object(self.sync, 'create_or_update_subpage', side_effect=create_or_update) as mock_sync, \
+             patch.object(self.sync, '_save_sync_cache') as mock_save:
+            with self.assertRaises(KeyboardInterrupt):
+                self.sync.sync_project(self.test_dir)
+        self.assertLess(mock_sync.call_count, 30)
+        mock_save.assert_called_once()
+
+    def test_sync_reports_progress_per_file(self):
+        self.create_test_file("a.py", "# a")
+        self.create_test_file("b.py", "# b")
+        self.mock_notion_client.pages.create.return_value = {"id": "page"}
+        with patch.object(Config, 'load_env_from_path'), \
+             patch.object(self.sync, '_refresh_client'), \
+             patch.object(self.sync, 'load_cache_for_project', return_value=Path(self.test_dir) / "cache.json"), \
+             patch('builtins.print') as mock_print:
+            self.sync.sync_project(self.test_dir)
+        lines = [c.args[0] for c in mock_print.call_args_list if c.args]
+        self.assertIn("[1/2] Syncing a.py...", lines)
+        self.assertIn("[2/2] Syncing b.py...", lines)
+
 
 if __name__ == '__main__':
-    unittest.main(verbosity=2)
\ No newline at end of file
+    unittest.main(verbosity=2)